@@ -0,0 +1,126 @@
+"""Helper functions for loading many rows at once into the new database.
+Used by the migration scripts instead of one INSERT per row from the old database."""
+
+from psycopg2.extras import execute_values
+
+# number of rows sent to the new db in one statement
+BATCH_SIZE = 1000
+
+# reserve a number of new id:s from the id sequence of the given table
+# the id:s are reserved before inserting, which means we know exactly which old id gets which new id
+def reserve_ids(cursor, table, count):
+    fetch_query = """SELECT nextval(pg_get_serial_sequence(%s, 'id')) FROM generate_series(1, %s)"""
+    cursor.execute(fetch_query, (table, count))
+    return [row[0] for row in cursor.fetchall()]
+
+# insert one batch of rows with reserved id:s and add old id -> new id to the dictionary
+def insert_batch(cursor, table, columns, batch, id_dictionary):
+    new_ids = reserve_ids(cursor, table, len(batch))
+    insert_query = "INSERT INTO " + table + "(id, " + ", ".join(columns) + ") VALUES %s"
+    values_to_insert = []
+    for new_id, (old_id, values) in zip(new_ids, batch):
+        values_to_insert.append((new_id,) + tuple(values))
+        id_dictionary[old_id] = new_id
+    execute_values(cursor, insert_query, values_to_insert, page_size=len(values_to_insert))
+
+# insert rows into table in batches instead of one row at a time
+# rows is an iterable of (old_id, values_to_insert), where values_to_insert follows the order of columns
+# returns a dictionary with old id:s as keys and new id:s as values, just like the per-row inserts did
+def insert_rows_with_id_mapping(cursor, table, columns, rows, batch_size=BATCH_SIZE):
+    id_dictionary = {}
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == batch_size:
+            insert_batch(cursor, table, columns, batch, id_dictionary)
+            batch = []
+    if len(batch) > 0:
+        insert_batch(cursor, table, columns, batch, id_dictionary)
+    return id_dictionary
+
+# characters that have to be escaped in the text format of COPY
+COPY_ESCAPES = str.maketrans({"\\": "\\\\", "\t": "\\t", "\n": "\\n", "\r": "\\r"})
+
+# turn one row into a line in the text format of COPY; None becomes NULL
+def format_copy_line(row):
+    fields = []
+    for value in row:
+        if value is None:
+            fields.append("\\N")
+        else:
+            fields.append(str(value).translate(COPY_ESCAPES))
+    return "\t".join(fields) + "\n"
+
+# file-like object that COPY reads from; the rows are formatted only when COPY asks for more data,
+# so the rows can come from a generator and are never all held in memory
+class CopyRowStream:
+    def __init__(self, rows):
+        self.rows = iter(rows)
+        self.buffer = ""
+        self.row_count = 0
+
+    def read(self, size=-1):
+        while size < 0 or len(self.buffer) < size:
+            row = next(self.rows, None)
+            if row is None:
+                break
+            self.buffer += format_copy_line(row)
+            self.row_count += 1
+        if size < 0:
+            size = len(self.buffer)
+        data = self.buffer[:size]
+        self.buffer = self.buffer[size:]
+        return data
+
+    def readline(self, size=-1):
+        return self.read(size)
+
+# stream rows into table with one COPY FROM STDIN
+# rows is an iterable of tuples following the order of columns; returns the number of rows copied
+def copy_rows(cursor, table, columns, rows):
+    copy_query = "COPY " + table + "(" + ", ".join(columns) + ") FROM STDIN"
+    stream = CopyRowStream(rows)
+    cursor.copy_expert(copy_query, stream)
+    return stream.row_count
+
+# set column for many rows in table at once
+# pairs is an iterable of (id, value); they are copied into a temporary table which is then joined with table in one UPDATE
+# returns the number of updated rows
+def update_rows(cursor, table, column, pairs):
+    staging_table = "staging_" + table + "_" + column
+    # the staging table gets the same column types as the target table
+    cursor.execute("CREATE TEMP TABLE " + staging_table + " AS SELECT id, " + column + " AS value FROM " + table + " WITH NO DATA")
+    copy_rows(cursor, staging_table, ("id", "value"), pairs)
+    cursor.execute("UPDATE " + table + " SET " + column + " = " + staging_table + ".value FROM " + staging_table + " WHERE " + table + ".id = " + staging_table + ".id")
+    row_count = cursor.rowcount
+    cursor.execute("DROP TABLE " + staging_table)
+    return row_count
+
+# column types for the tables we have already looked up, with (table, columns) as key
+column_type_cache = {}
+
+# get the database types of the given columns in table, in the same order as columns
+# the types are needed for casting values in VALUES lists, since NULL and string values are otherwise read as text
+def get_column_types(cursor, table, columns):
+    key = (table, tuple(columns))
+    if key not in column_type_cache:
+        fetch_query = """SELECT attname, format_type(atttypid, atttypmod) FROM pg_attribute WHERE attrelid = %s::regclass AND attname = ANY(%s)"""
+        cursor.execute(fetch_query, (table, list(columns)))
+        type_dict = dict(cursor.fetchall())
+        column_type_cache[key] = [type_dict[column] for column in columns]
+    return column_type_cache[key]
+
+# insert rows into table and link each new row to its parent row, all in one statement
+# rows is a list of (parent_id, values_to_insert); link_column in parent_table is set to the id of the new row
+# the new id:s are taken from the table's id sequence in a data-modifying CTE, which is then joined back to the parent table
+def insert_and_link(cursor, table, columns, parent_table, link_column, rows):
+    if len(rows) == 0:
+        return
+    column_list = ", ".join(columns)
+    types = [get_column_types(cursor, parent_table, ("id",))[0]] + get_column_types(cursor, table, columns)
+    template = "(" + ", ".join("%s::" + type for type in types) + ")"
+    insert_query = ("WITH new_rows AS (SELECT nextval(pg_get_serial_sequence('" + table + "', 'id')) AS id, source.* FROM (VALUES %s) AS source(parent_id, " + column_list + ")), "
+                    "inserted AS (INSERT INTO " + table + "(id, " + column_list + ") SELECT id, " + column_list + " FROM new_rows) "
+                    "UPDATE " + parent_table + " SET " + link_column + " = new_rows.id FROM new_rows WHERE " + parent_table + ".id = new_rows.parent_id")
+    values_to_insert = [(parent_id,) + tuple(values) for parent_id, values in rows]
+    execute_values(cursor, insert_query, values_to_insert, template=template, page_size=len(values_to_insert))
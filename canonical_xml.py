@@ -0,0 +1,37 @@
+"""Canonical form of the body element of TEI XML files, for comparing the files on the web server (in var/) with the
+original files in SVN. The web files have attributes that were added when they were published (n on l, xml:id on lg
+and p). The file is parsed up to the end of the body, the body is detached from the parsed tree, the attributes are removed
+from it, and it is then serialized with C14N and its whitespace
+normalized, so two files with the same content get the same canonical body and the same digest."""
+
+import copy
+import hashlib
+import re
+from lxml import etree
+
+XML_ID = "{http://www.w3.org/XML/1998/namespace}id"
+# local name of element as key, attributes that are removed from it as value
+ADDED_ATTRIBUTES = {"l": ("n",), "lg": (XML_ID,), "p": (XML_ID,)}
+
+# parse an xml file (a file path or a file object) and return the canonical form of its body element
+# parsing stops at the end of the body; returns an empty string if the file has no body
+# the body is copied out of the tree being parsed before it is changed and serialized, since an element still attached to
+# the iterparse tree gets extra namespace declarations (xmlns="") on its descendants
+def canonicalize_body(source):
+    for event, element in etree.iterparse(source, events=("end",), recover=True):
+        if not isinstance(element.tag, str) or etree.QName(element).localname != "body":
+            continue
+        body = copy.deepcopy(element)
+        for descendant in body.iter():
+            if not isinstance(descendant.tag, str):
+                continue
+            for attribute in ADDED_ATTRIBUTES.get(etree.QName(descendant).localname, ()):
+                if attribute in descendant.attrib:
+                    del descendant.attrib[attribute]
+        canonical_body = etree.tostring(body, method="c14n").decode("utf-8")
+        return re.sub(r"\s+", " ", canonical_body).strip()
+    return ""
+
+# returns the digest of a canonical body; equal digests mean equal content
+def get_body_digest(canonical_body):
+    return hashlib.sha256(canonical_body.encode("utf-8")).hexdigest()
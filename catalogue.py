@@ -0,0 +1,84 @@
+"""In-memory snapshot of the collections, publications, versions and manuscripts in the new database.
+The rows of all projects, of a project or of some collections are loaded with one query per table, and indexed by id, legacy id,
+collection and publication, so the scripts can look up values without one select for each item.
+Collections and publications are always loaded; versions and manuscripts only if they are asked for.
+Legacy id:s that are looked up but not found are remembered, so they can be reported once."""
+
+from collections import namedtuple
+
+Collection = namedtuple("Collection", ["id", "name", "published", "legacy_id"])
+Publication = namedtuple("Publication", ["id", "publication_collection_id", "name", "published", "legacy_id"])
+Version = namedtuple("Version", ["id", "publication_id", "name", "legacy_id"])
+Manuscript = namedtuple("Manuscript", ["id", "publication_id", "name", "legacy_id"])
+
+# the optional tables that can be loaded in addition to collections and publications
+ALL_TABLES = ("versions", "manuscripts")
+
+class Catalogue:
+    # collection_condition is an sql condition on table publication_collection (alias c) with its values
+    # tables tells which of the optional tables (versions, manuscripts) are loaded; the others are left empty
+    def __init__(self, cursor, collection_condition, values, tables=ALL_TABLES):
+        cursor.execute("""SELECT c.id, c.name, c.published, c.legacy_id FROM publication_collection c WHERE """ + collection_condition + """ ORDER BY c.id""", values)
+        self.collections = [Collection(*row) for row in cursor.fetchall()]
+        cursor.execute("""SELECT p.id, p.publication_collection_id, p.name, p.published, p.legacy_id FROM publication p JOIN publication_collection c ON c.id = p.publication_collection_id WHERE """ + collection_condition + """ ORDER BY p.id""", values)
+        self.publications = [Publication(*row) for row in cursor.fetchall()]
+        self.versions = []
+        self.manuscripts = []
+        if "versions" in tables:
+            cursor.execute("""SELECT v.id, v.publication_id, v.name, v.legacy_id FROM publication_version v JOIN publication p ON p.id = v.publication_id JOIN publication_collection c ON c.id = p.publication_collection_id WHERE """ + collection_condition + """ ORDER BY v.id""", values)
+            self.versions = [Version(*row) for row in cursor.fetchall()]
+        if "manuscripts" in tables:
+            cursor.execute("""SELECT m.id, m.publication_id, m.name, m.legacy_id FROM publication_manuscript m JOIN publication p ON p.id = m.publication_id JOIN publication_collection c ON c.id = p.publication_collection_id WHERE """ + collection_condition + """ ORDER BY m.id""", values)
+            self.manuscripts = [Manuscript(*row) for row in cursor.fetchall()]
+        self.collections_by_id = {collection.id: collection for collection in self.collections}
+        self.publications_by_id = {}
+        self.publications_by_legacy_id = {}
+        self.publications_by_collection = {}
+        for publication in self.publications:
+            self.publications_by_id[publication.id] = publication
+            # if several publications have the same legacy id, the one with the lowest id is used
+            if publication.legacy_id is not None:
+                self.publications_by_legacy_id.setdefault(str(publication.legacy_id), publication)
+            self.publications_by_collection.setdefault(publication.publication_collection_id, []).append(publication)
+        self.versions_by_publication = {}
+        for version in self.versions:
+            self.versions_by_publication.setdefault(version.publication_id, []).append(version)
+        self.manuscripts_by_publication = {}
+        for manuscript in self.manuscripts:
+            self.manuscripts_by_publication.setdefault(manuscript.publication_id, []).append(manuscript)
+        # legacy id:s of publications that were looked up but not found
+        self.missing_legacy_ids = set()
+
+    # returns the publication with this legacy id, or None if there is none
+    # print_missing prints a message the first time a legacy id isn't found
+    def get_publication_by_legacy_id(self, legacy_id, print_missing=False):
+        publication = self.publications_by_legacy_id.get(str(legacy_id))
+        if publication is None and legacy_id not in self.missing_legacy_ids:
+            self.missing_legacy_ids.add(legacy_id)
+            if print_missing:
+                print(legacy_id, "not found in publication")
+        return publication
+
+    # returns the publications in a collection, ordered by id
+    def get_publications(self, collection_id):
+        return self.publications_by_collection.get(collection_id, [])
+
+    # returns a list of (publication, version) for all versions of the publications in a collection
+    def get_versions(self, collection_id):
+        return [(publication, version) for publication in self.get_publications(collection_id) for version in self.versions_by_publication.get(publication.id, [])]
+
+    # returns a list of (publication, manuscript) for all manuscripts of the publications in a collection
+    def get_manuscripts(self, collection_id):
+        return [(publication, manuscript) for publication in self.get_publications(collection_id) for manuscript in self.manuscripts_by_publication.get(publication.id, [])]
+
+# load the collections of a project, with their publications and the optional tables in tables
+def load_project_catalogue(cursor, project_id, tables=ALL_TABLES):
+    return Catalogue(cursor, "c.project_id = %s", (project_id,), tables)
+
+# load the collections of all projects, with their publications and the optional tables in tables
+def load_catalogue(cursor, tables=ALL_TABLES):
+    return Catalogue(cursor, "TRUE", (), tables)
+
+# load the given collections with their publications and the optional tables in tables
+def load_collection_catalogue(cursor, collection_ids, tables=ALL_TABLES):
+    return Catalogue(cursor, "c.id = ANY(%s)", (list(collection_ids),), tables)
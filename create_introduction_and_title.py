@@ -3,7 +3,9 @@ Created by Anna Movall and Jonas Lillqvist in April 2020"""
 
 import psycopg2
 import re
-import json
+
+from bulk_load import insert_and_link
+from id_map import read_id_map
 
 conn_new_db = psycopg2.connect(
     host="",
@@ -36,60 +38,47 @@ def create_list_from_csv(filename):
             collection_name_list.append(elements)
     return collection_name_list
 
-def read_dict_from_file(filename):
-    with open(filename, encoding="utf-8") as source_file:
-        json_content = json.load(source_file)
-        return json_content
-
 # create a dictionary with new collection id as key and file name base as value
-def create_collection_name_dict(collection_names_with_old_id, collection_id_dict):
+def create_collection_name_dict(collection_names_with_old_id, collection_id_map):
     coll_name_dict = {}
     for row in collection_names_with_old_id:
         old_coll_id = row[0]
         coll_name = row[1]
-        new_coll_id = collection_id_dict[old_coll_id]
+        new_coll_id = collection_id_map[int(old_coll_id)]
         coll_name_dict[new_coll_id] = coll_name
     return coll_name_dict
 
-# insert data into table publication_collection_introduction
-def create_publication_collection_introduction(published, introduction_original_filename):
-    insert_query = """INSERT INTO publication_collection_introduction(published, original_filename) VALUES (%s, %s) RETURNING id"""
-    values_to_insert = (published, introduction_original_filename)
-    cursor_new.execute(insert_query, values_to_insert)
-    introduction_id = cursor_new.fetchone()[0]
-    return introduction_id
-
-# insert data into table publication_collection_title
-def create_publication_collection_title(published, title_page_original_filename):
-    insert_query = """INSERT INTO publication_collection_title(published, original_filename) VALUES (%s, %s) RETURNING id"""
-    values_to_insert = (published, title_page_original_filename)
-    cursor_new.execute(insert_query, values_to_insert)
-    title_page_id = cursor_new.fetchone()[0]
-    return title_page_id
+# insert data into table publication_collection_introduction and update table publication_collection with the introduction ids
+# rows is a list of (collection_id, (published, original_filename))
+def create_publication_collection_introduction(rows):
+    insert_and_link(cursor_new, "publication_collection_introduction", ("published", "original_filename"), "publication_collection", "publication_collection_introduction_id", rows)
 
-# update table publication_collection with the ids for introduction and title page
-def update_publication_collection(introduction_id, title_page_id, collection_id):
-    update_query = """UPDATE publication_collection SET publication_collection_introduction_id=%s, publication_collection_title_id=%s WHERE id=%s"""
-    values_to_insert = (introduction_id, title_page_id, collection_id)
-    cursor_new.execute(update_query, values_to_insert)
+# insert data into table publication_collection_title and update table publication_collection with the title page ids
+# rows is a list of (collection_id, (published, original_filename))
+def create_publication_collection_title(rows):
+    insert_and_link(cursor_new, "publication_collection_title", ("published", "original_filename"), "publication_collection", "publication_collection_title_id", rows)
 
 def main():
     collection_info = get_info_from_publication_collection(PROJECT_ID)
     # create list of old collection ids and collection names for file name bases
     collection_names_with_old_id = create_list_from_csv("csv/introduction_title_names.csv")
-    # create dict mapping old and new collection ids
-    collection_id_dict = read_dict_from_file("id_dictionaries/collection_ids.json")
+    # create id map connecting old and new collection ids
+    collection_id_map = read_id_map("id_dictionaries/collection_ids.idmap")
     # create dict mapping new ids and file name bases
-    collection_name_dict_with_new_ids = create_collection_name_dict(collection_names_with_old_id, collection_id_dict)
+    collection_name_dict_with_new_ids = create_collection_name_dict(collection_names_with_old_id, collection_id_map)
+    introduction_rows = []
+    title_page_rows = []
     for collection in collection_info:
         collection_id = collection[0]
         published = collection[1]
         name = collection_name_dict_with_new_ids[collection_id]
         introduction_original_filename = INTRODUCTION_FILE_PATH + name + "_inl.xml"
-        introduction_id = create_publication_collection_introduction(published, introduction_original_filename)
+        introduction_rows.append((collection_id, (published, introduction_original_filename)))
         title_page_original_filename = TITLE_PAGE_FILE_PATH + name + "_tit.xml"
-        title_page_id = create_publication_collection_title(published, title_page_original_filename)
-        update_publication_collection(introduction_id, title_page_id, collection_id)
+        title_page_rows.append((collection_id, (published, title_page_original_filename)))
+    # one statement for all introductions and one for all title pages
+    create_publication_collection_introduction(introduction_rows)
+    create_publication_collection_title(title_page_rows)
     conn_new_db.commit()
     cursor_new.close()
     conn_new_db.close()
@@ -1,17 +1,30 @@
 """
 Script that fetches info from table tableofcontents in old db and transforms it
 into one toc json file for each new collection.
+With --incremental, only the toc files whose content has changed since the last run are written.
 Created by Anna Movall and Jonas Lillqvist in March 2020.
 """
 
+import argparse
 import mysql.connector
 import psycopg2
+import hashlib
 import json
 import operator
+import os
 import re
+import tempfile
+
+from source_reader import stream_rows
+from id_map import read_id_map
+from csv_registry import get_csv_list
+from catalogue import load_project_catalogue
 
 # insert current project id here
 PROJECT_ID = 10
+TOC_FOLDER = "toc_files/"
+# checksum of the content of each toc file written, with new collection id as key
+CHECKSUM_FILE = "toc_files/checksums.json"
 
 conn_old_db = mysql.connector.connect(
     host="",
@@ -30,46 +43,43 @@ conn_new_db = psycopg2.connect(
 )
 cursor_new = conn_new_db.cursor()
 
-def read_dict_from_file(filename):
-    with open(filename, encoding="utf-8") as source_file:
-        json_content = json.load(source_file)
-        return json_content
+# publications of the current project, for looking up publication id:s using legacy id:s
+catalogue = load_project_catalogue(cursor_new, PROJECT_ID, tables=())
 
-# get info about toc items in one collection from old db 
-def get_toc_info(old_collection_id):
-    # collection Letters (Brev) was split into two new collections (30, 31), which are not part of old table publications or tableofcontents, only table publications_collections
-    # we need to change their old collection id to the actual old id 15 and not use  publications_collections id 30/31, found in the coll_id_dict
-    if old_collection_id == "30":
-        fetch_query = """SELECT tableofcontents.title, toc_date, toc_linkID, tableofcontents.sortOrder, publications_group.sortOrder FROM tableofcontents, publications_group WHERE toc_zts_id=%s AND toc_coll_id=%s AND toc_group_id=group_id"""
-        values_to_insert = (15, 1)
-    elif old_collection_id == "31":
-        fetch_query = """SELECT title, toc_date, toc_linkID, sortOrder FROM tableofcontents WHERE toc_zts_id=%s AND toc_coll_id=%s"""
-        values_to_insert = (15, 2)
-    else:
-        fetch_query = """SELECT title, toc_date, toc_linkID, sortOrder FROM tableofcontents WHERE toc_zts_id=%s"""
-        values_to_insert = (old_collection_id,)
-    cursor_old.execute(fetch_query, values_to_insert)
-    toc_info = cursor_old.fetchall()
-    # the date value for Brev needs to be edited so that None is substituted with "0"
-    # otherwise sorting by date is not possible
-    # to be editable, the tuples in toc_info need to be lists
-    if old_collection_id == "30" or old_collection_id == "31":
-        toc_info_list = []
-        for tuple in toc_info:
-            row_list = list(tuple)
-            if row_list[1] is None:
-                row_list[1] = "0"
-            toc_info_list.append(row_list)
-    # for Forlagskorrespondens, sort based on publications_group.sortOrder, then based on date 
+# get info about toc items in all collections from old db with one query
+# yields rows of (old collection id, title, toc_date, toc_linkID, sortOrder, publications_group.sortOrder)
+# collection Letters (Brev) was split into two new collections (30, 31), which are not part of old table publications or tableofcontents, only table publications_collections
+# their rows have the actual old id 15 and a toc_coll_id (1 or 2), so they are selected separately and given the old id 30 or 31
+# only the rows of Forlagskorrespondens (30) are joined with publications_group; only rows with a group are included
+# the date value for Brev needs to be edited so that None is substituted with "0"; otherwise sorting by date is not possible
+def get_toc_info(old_collection_ids):
+    selects = []
+    values = []
+    if 30 in old_collection_ids:
+        selects.append("""SELECT 30 AS collection_key, tableofcontents.title, COALESCE(toc_date, '0'), toc_linkID, tableofcontents.sortOrder, publications_group.sortOrder FROM tableofcontents, publications_group WHERE toc_zts_id=%s AND toc_coll_id=%s AND toc_group_id=group_id""")
+        values.extend([15, 1])
+    if 31 in old_collection_ids:
+        selects.append("""SELECT 31 AS collection_key, title, COALESCE(toc_date, '0'), toc_linkID, sortOrder, NULL FROM tableofcontents WHERE toc_zts_id=%s AND toc_coll_id=%s""")
+        values.extend([15, 2])
+    other_ids = [old_id for old_id in old_collection_ids if old_id not in (30, 31)]
+    if other_ids:
+        selects.append("""SELECT toc_zts_id AS collection_key, title, toc_date, toc_linkID, sortOrder, NULL FROM tableofcontents WHERE toc_zts_id IN (""" + ", ".join(["%s"] * len(other_ids)) + """)""")
+        values.extend(other_ids)
+    if not selects:
+        return iter(())
+    fetch_query = " UNION ALL ".join(selects)
+    return stream_rows(conn_old_db, fetch_query, tuple(values))
+
+# sort the toc rows of one collection (without the collection id) in the order of the collection's toc
+# the rows are sorted in Python as before, so the order doesn't depend on the collation of the old db
+# for Forlagskorrespondens (30), sort based on publications_group.sortOrder, then based on date
+# for Foraldrakorrespondens (31), sort based on date; for other collections, sort based on sortOrder
+def sort_toc_info(old_collection_id, toc_info):
     if old_collection_id == "30":
-        toc_info_sorted = sorted(toc_info_list, key = operator.itemgetter(4,1))
-    # for Foraldrakorrespondens, sort based on date
+        return sorted(toc_info, key = operator.itemgetter(4,1))
     elif old_collection_id == "31":
-        toc_info_sorted = sorted(toc_info_list, key = operator.itemgetter(1))
-    # for other collections, sort based on sortOrder
-    else:
-        toc_info_sorted = sorted(toc_info, key = operator.itemgetter(3))
-    return toc_info_sorted
+        return sorted(toc_info, key = operator.itemgetter(1))
+    return sorted(toc_info, key = operator.itemgetter(3))
 
 # creates toc dictionary, used for json file
 def create_dictionary(toc_info_sorted, old_collection_id, new_collection_id):
@@ -144,30 +154,51 @@ def add_itemId(row, old_collection_id, new_collection_id):
             itemId = str(new_collection_id) + "_" + str(publication_id) + "_" + fragment_id
     return itemId
 
-# get publication_id from new db using legacy_id
-# limit selection to publications connected to the current publication collection
+# get publication_id using legacy_id from the catalogue of the current project
+# a legacy id that is not found is reported once
 def fetch_publication_id(legacy_id):
-    fetch_query = """SELECT id FROM publication WHERE legacy_id=%s AND publication_collection_id IN (SELECT id FROM publication_collection WHERE project_id=%s)"""
-    value_to_insert = (legacy_id, PROJECT_ID)
-    cursor_new.execute(fetch_query, value_to_insert)
-    result = cursor_new.fetchone()
-    if result is None:
-        print(legacy_id, "not found in publication")
+    publication = catalogue.get_publication_by_legacy_id(legacy_id, print_missing=True)
+    if publication is None:
         publication_id = ""
     else:
-        publication_id = result[0]
+        publication_id = publication.id
     return publication_id
 
-def write_dict_to_file(dictionary, filename):
-    json_dict = json.dumps(dictionary, ensure_ascii=False)
-    with open(filename, "w", encoding="utf-8") as output_file:
-        output_file.write(json_dict)
-        print("Dictionary written to file", filename)
+# write text to a temporary file in the same folder and then rename it, so that a reader never sees a half-written file
+def write_text_to_file(text, filename):
+    file_descriptor, temp_filename = tempfile.mkstemp(dir=os.path.dirname(filename), suffix=".tmp")
+    with os.fdopen(file_descriptor, "w", encoding="utf-8") as output_file:
+        output_file.write(text)
+    # mkstemp creates the file readable only by its owner; the toc files need to be readable by the web server
+    os.chmod(temp_filename, 0o644)
+    os.replace(temp_filename, filename)
+
+# read the checksums of the toc files from the previous run; returns an empty dictionary if there are none
+def read_checksums():
+    try:
+        with open(CHECKSUM_FILE, encoding="utf-8") as source_file:
+            return json.load(source_file)
+    except (OSError, ValueError):
+        return {}
+
+# write toc dictionary to the collection's json file and save the checksum of its content
+# in incremental mode, the file is not written if its content is the same as last time, so its modification time is kept
+def write_toc_to_file(collection_toc_dict, new_collection_id, checksums, incremental):
+    filename = TOC_FOLDER + str(new_collection_id) + ".json"
+    json_dict = json.dumps(collection_toc_dict, ensure_ascii=False)
+    # the toc content is built from the rows in tableofcontents and the item id:s resolved from them
+    checksum = hashlib.sha256(json_dict.encode("utf-8")).hexdigest()
+    if incremental and checksums.get(str(new_collection_id)) == checksum and os.path.exists(filename):
+        print("Unchanged", filename)
+        return
+    write_text_to_file(json_dict, filename)
+    checksums[str(new_collection_id)] = checksum
+    print("Dictionary written to file", filename)
 
 # special function for generating toc for Lfb: values from csv, not from table tableofcontents    
-def create_toc_for_Lfb(filename, collection_id_dict):
-    lfb_list = create_list_from_csv(filename)
-    new_collection_id = collection_id_dict["32"]
+def create_toc_for_Lfb(filename, collection_id_map, checksums, incremental):
+    lfb_list = get_csv_list(filename)
+    new_collection_id = collection_id_map[32]
     collection_toc_dict = {"text": "Läsning för barn", "collectionId": str(new_collection_id), "type": "title", "children": []}
     for row in lfb_list:
         title = row[0]
@@ -176,34 +207,29 @@ def create_toc_for_Lfb(filename, collection_id_dict):
         itemId = str(new_collection_id) + "_" + str(publication_id)
         toc_item_dict = {"url": "", "type": "est", "text": title, "itemId": itemId, "date": ""}
         collection_toc_dict["children"].append(toc_item_dict)
-    filename = "toc_files/" + str(new_collection_id) + ".json"
-    write_dict_to_file(collection_toc_dict, filename)
-    
-# creates a list from csv file with publication name, div id, publication id and legacy id
-def create_list_from_csv(filename):
-    with open(filename, "r", encoding="utf-8") as source_file:
-        lfb_list = []
-        for line in source_file:
-            row = line.rstrip()
-            elements = row.split(";")
-            lfb_list.append(elements)
-        return lfb_list
+    write_toc_to_file(collection_toc_dict, new_collection_id, checksums, incremental)
 
 def main():
-    collection_id_dict = read_dict_from_file("id_dictionaries/collection_ids.json")
-    for key in collection_id_dict.keys():
-        old_collection_id = key # string value!
-        # toc for Lasning for barn is created from csv file with a special function
-        if old_collection_id == "32":
-            continue
-        new_collection_id = collection_id_dict[old_collection_id]
-        toc_info_sorted = get_toc_info(old_collection_id)
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--incremental", action="store_true", help="only write the toc files that have changed")
+    incremental = parser.parse_args().incremental
+    checksums = read_checksums()
+    collection_id_map = read_id_map("id_dictionaries/collection_ids.idmap")
+    # toc for Lasning for barn is created from csv file with a special function
+    toc_collections = [(old_id, new_collection_id) for old_id, new_collection_id in collection_id_map.items() if old_id != 32]
+    # the rows are collected by old collection id; the id may come back from the query as a string, so it is converted to int
+    toc_info_dict = {}
+    for row in get_toc_info([old_id for old_id, new_collection_id in toc_collections]):
+        toc_info_dict.setdefault(int(row[0]), []).append(row[1:])
+    for old_id, new_collection_id in toc_collections:
+        old_collection_id = str(old_id) # string value!
+        toc_info_sorted = sort_toc_info(old_collection_id, toc_info_dict.get(old_id, []))
         # toc_info_sorted will be an empty list if key is not found in tableofcontents!
         collection_toc_dict = create_dictionary(toc_info_sorted, old_collection_id, new_collection_id)
         if collection_toc_dict:
-            filename = "toc_files/" + str(new_collection_id) + ".json"
-            write_dict_to_file(collection_toc_dict, filename)
-    create_toc_for_Lfb("csv/Lfb_split.csv", collection_id_dict)
+            write_toc_to_file(collection_toc_dict, new_collection_id, checksums, incremental)
+    create_toc_for_Lfb("csv/Lfb_split.csv", collection_id_map, checksums, incremental)
+    write_text_to_file(json.dumps(checksums), CHECKSUM_FILE)
     conn_new_db.close()
     cursor_new.close()
     conn_old_db.close()
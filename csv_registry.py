@@ -0,0 +1,41 @@
+"""Registry for the mapping files in the csv folder, which have one row per line with values separated by semicolons.
+Each file is read and parsed once and then kept in memory, together with its modification time and size.
+If a file has changed on disk since it was read (e.g. when one of the split scripts has rewritten it), it is read again."""
+
+import os
+
+# absolute file path as key, dictionary with modification time, size, rows and key-value dictionaries as value
+csv_registry = {}
+
+# returns the registry entry for a csv file, reading the file only if it hasn't been read or has changed since
+def get_csv_entry(filename):
+    file_stat = os.stat(filename)
+    key = os.path.abspath(filename)
+    entry = csv_registry.get(key)
+    if entry is None or entry["mtime"] != file_stat.st_mtime_ns or entry["size"] != file_stat.st_size:
+        rows = []
+        with open(filename, "r", encoding="utf-8") as source_file:
+            for line in source_file:
+                row = line.rstrip()
+                elements = row.split(";")
+                rows.append(tuple(elements))
+        entry = {"mtime": file_stat.st_mtime_ns, "size": file_stat.st_size, "rows": rows, "dicts": {}}
+        csv_registry[key] = entry
+    return entry
+
+# creates a list from csv file, with a list of values for each row
+# the lists are new for each call, since the split scripts append the new file paths to the rows
+def get_csv_list(filename):
+    return [list(row) for row in get_csv_entry(filename)["rows"]]
+
+# creates a dictionary from csv file, with the value in key_column as key and the value in value_column as value
+# the dictionary is shared by all callers, so it must not be changed
+def get_csv_dict(filename, key_column=0, value_column=1):
+    entry = get_csv_entry(filename)
+    columns = (key_column, value_column)
+    if columns not in entry["dicts"]:
+        info_dict = {}
+        for row in entry["rows"]:
+            info_dict[row[key_column]] = row[value_column]
+        entry["dicts"][columns] = info_dict
+    return entry["dicts"][columns]
@@ -8,6 +8,9 @@ import re
 import requests
 from bs4 import BeautifulSoup
 from datetime import date
+from psycopg2.extras import execute_values
+
+from catalogue import load_catalogue
 
 conn_new_db = psycopg2.connect(
     host="",
@@ -21,7 +24,7 @@ cursor_new = conn_new_db.cursor()
 CSV_FILEPATH = ""
 
 # creates a list from csv file containing old publication id and facsimile url
-def create_list_from_csv(filename):
+def create_list_from_csv(filename, catalogue):
     with open(filename, "r", encoding="utf-8") as source_file:
         facsimile_url_list = []
         for line in source_file:
@@ -29,19 +32,16 @@ def create_list_from_csv(filename):
             elements = row.split(";")
             legacy_id = elements[0]
             url = elements[1]
-            publication_id = get_publication_id_from_legacy_id(legacy_id)
+            publication_id = get_publication_id_from_legacy_id(legacy_id, catalogue)
             if publication_id:
                 facsimile_url_list.append([publication_id, url])
         return facsimile_url_list
 
-# get new id from table publication using old id
-def get_publication_id_from_legacy_id(legacy_id):
-    fetch_query = """SELECT id FROM publication WHERE legacy_id=%s"""
-    value_to_insert = (legacy_id,)
-    cursor_new.execute(fetch_query, value_to_insert)
-    result = cursor_new.fetchone()
-    if result:
-        publication_id = result[0]
+# get new publication id from the catalogue using old id
+def get_publication_id_from_legacy_id(legacy_id, catalogue):
+    publication = catalogue.get_publication_by_legacy_id(legacy_id)
+    if publication:
+        publication_id = publication.id
     else:
         publication_id = False
     return publication_id
@@ -104,28 +104,28 @@ def set_facsimile_order(facsimile_url_list):
         row.append(priority)
         publication_id = row[0]
 
-# inserts needed values into table publication_facsimile_collection, returning the newly created id for the facsimile
-# calls function create_publication_facsimile which inserts facsimile id and publication id into table publication_facsimile
+# inserts needed values into table publication_facsimile_collection and links each new facsimile to its publication in table publication_facsimile
+# both inserts are done for all rows in one statement: the new facsimile ids are taken from the id sequence in a CTE,
+# which is used both for the facsimile collections and for the rows in publication_facsimile
 def create_publication_facsimile_collection(facsimile_url_list):
-    insert_query = """INSERT INTO publication_facsimile_collection(title, external_url) VALUES (%s, %s) RETURNING id"""
+    if len(facsimile_url_list) == 0:
+        return
+    insert_query = """WITH new_rows AS (SELECT nextval(pg_get_serial_sequence('publication_facsimile_collection', 'id')) AS id, source.* FROM (VALUES %s) AS source(publication_id, title, url, priority)),
+    inserted AS (INSERT INTO publication_facsimile_collection(id, title, external_url) SELECT id, title, url FROM new_rows)
+    INSERT INTO publication_facsimile(publication_facsimile_collection_id, publication_id, page_nr, section_id, priority, type) SELECT id, publication_id, 0, 0, priority, 0 FROM new_rows"""
+    values_to_insert = []
     for row in facsimile_url_list:
         publication_id = row[0]
         url = row[1]
         title = row[2]
         priority = row[3]
-        values_to_insert = (title, url)
-        cursor_new.execute(insert_query, values_to_insert)
-        facsimile_id = cursor_new.fetchone()[0]
-        create_publication_facsimile(publication_id, facsimile_id, priority)
-
-# inserts facsimile id and publication id into table publication_facsimile
-def create_publication_facsimile(publication_id, facsimile_id, priority):
-    insert_query = """INSERT INTO publication_facsimile(publication_facsimile_collection_id, publication_id, page_nr, section_id, priority, type) VALUES (%s, %s, %s, %s, %s, %s)"""
-    values_to_insert = (facsimile_id, publication_id, 0, 0, priority, 0)
-    cursor_new.execute(insert_query, values_to_insert)
+        values_to_insert.append((publication_id, title, url, priority))
+    execute_values(cursor_new, insert_query, values_to_insert, template="(%s::integer, %s::text, %s::text, %s::integer)", page_size=len(values_to_insert))
 
 def main():
-    facsimile_url_list = create_list_from_csv(CSV_FILEPATH)
+    # publications of all projects, for looking up publication id:s using legacy id:s
+    catalogue = load_catalogue(cursor_new, tables=())
+    facsimile_url_list = create_list_from_csv(CSV_FILEPATH, catalogue)
     add_metadata_to_list(facsimile_url_list)
     set_facsimile_order(facsimile_url_list)
     create_publication_facsimile_collection(facsimile_url_list)
@@ -0,0 +1,95 @@
+"""Inventory of the files in a folder tree, such as the collection folders in the SVN checkout.
+Each folder tree is walked once per run with os.scandir, and the result is saved in a cache file in the folder
+inventory_cache. The cache contains the entries of each folder together with the folder's modification time; when the
+tree is walked again, only folders whose modification time has changed are read again, the rest are taken from the cache.
+For each file, the inventory keeps its path relative to the root folder and its suffix. Sizes and modification times of
+files are not kept, since editing a file doesn't change the modification time of its folder and they could get out of date."""
+
+import hashlib
+import json
+import os
+import sys
+import tempfile
+from collections import namedtuple
+from pathlib import Path
+
+INVENTORY_CACHE_FOLDER = "inventory_cache"
+# change this if the format of the cache files changes
+CACHE_VERSION = 2
+
+FileRecord = namedtuple("FileRecord", ["relative_path", "suffix"])
+
+# absolute path of root folder as key, list of file records as value; each root is only walked once per run
+inventories = {}
+
+# each root folder has its own cache file, so that worker processes walking different roots don't overwrite each other's results
+def get_cache_filename(root):
+    key = hashlib.sha1(os.path.abspath(root).encode("utf-8")).hexdigest()
+    return os.path.join(INVENTORY_CACHE_FOLDER, key + ".json")
+
+# read the folders of a previous walk from cache file; returns an empty dictionary if there is no valid cache
+def read_cached_directories(root):
+    try:
+        with open(get_cache_filename(root), encoding="utf-8") as source_file:
+            cache = json.load(source_file)
+    except (OSError, ValueError):
+        return {}
+    if cache.get("version") != CACHE_VERSION or cache.get("root") != os.path.abspath(root):
+        return {}
+    return cache["directories"]
+
+# write the folders to cache file; the file is replaced at once, so a reader never sees a half-written file
+def write_cached_directories(root, directories):
+    os.makedirs(INVENTORY_CACHE_FOLDER, exist_ok=True)
+    cache = {"version": CACHE_VERSION, "root": os.path.abspath(root), "directories": directories}
+    file_descriptor, temp_filename = tempfile.mkstemp(dir=INVENTORY_CACHE_FOLDER, suffix=".tmp")
+    with os.fdopen(file_descriptor, "w", encoding="utf-8") as output_file:
+        json.dump(cache, output_file)
+    os.replace(temp_filename, get_cache_filename(root))
+
+# read the entries of one folder; returns a list of [name, is_dir] sorted by name
+def scan_directory(directory_path):
+    entries = []
+    with os.scandir(directory_path) as iterator:
+        for entry in iterator:
+            entries.append([entry.name, entry.is_dir()])
+    entries.sort(key=lambda entry: entry[0])
+    return entries
+
+# walk through folders recursively and append a record for each file to list
+# the entries of a folder are reused from the cache if the folder's modification time is unchanged
+def walk_directory(root, relative_dir, cached_directories, directories, records):
+    directory_path = os.path.join(root, relative_dir)
+    # the modification time is read before the folder, so a change made during the walk is found next time
+    directory_mtime = os.stat(directory_path).st_mtime_ns
+    cached_directory = cached_directories.get(relative_dir)
+    if cached_directory is not None and cached_directory["mtime"] == directory_mtime:
+        entries = cached_directory["entries"]
+    else:
+        entries = scan_directory(directory_path)
+    directories[relative_dir] = {"mtime": directory_mtime, "entries": entries}
+    for name, is_dir in entries:
+        relative_path = relative_dir + "/" + name if relative_dir else name
+        if is_dir:
+            walk_directory(root, relative_path, cached_directories, directories, records)
+        else:
+            records.append(FileRecord(sys.intern(relative_path), os.path.splitext(name)[1]))
+
+# returns the file records for all files in root folder and its subfolders, in the order of a walk with sorted entries
+def get_file_records(root):
+    key = os.path.abspath(root)
+    if key not in inventories:
+        cached_directories = read_cached_directories(root)
+        directories = {}
+        records = []
+        walk_directory(root, "", cached_directories, directories, records)
+        if directories != cached_directories:
+            write_cached_directories(root, directories)
+        inventories[key] = records
+    return inventories[key]
+
+# create path object for folder from given filepath string, return paths to all files found in this folder or subfolders in a list
+# if suffix is given (e.g. ".xml"), only files with that suffix are included
+def create_file_list(filepath, suffix=None):
+    path = Path(filepath)
+    return [path / record.relative_path for record in get_file_records(filepath) if suffix is None or record.suffix == suffix]
@@ -0,0 +1,158 @@
+"""Index of normalized file names, used for matching publication names with the file paths of a collection.
+The file names are normalized once per collection instead of once per publication. Each publication name
+is only compared with the files that can contain them: an inverted index of character trigrams narrows down the candidates,
+an exact substring is a match at once, and only the rest of the candidates are scored with rapidfuzz's partial_ratio, for all publication names of a collection in one call.
+rapidfuzz 3.6 or later and numpy are required: pip install rapidfuzz numpy"""
+
+import re
+from rapidfuzz import fuzz
+from rapidfuzz import process
+
+# remove special characters from publication names
+def normalize_publication_name(publication_name):
+    search_str = re.sub(r",|\.|\?|!|–|’|»|:|(|)|\[|\]|&", "", publication_name).strip()
+    search_str = search_str.replace(" ", "_").lower()
+    search_str = search_str.replace("-", "_")
+    search_str = search_str.replace("ä", "a")
+    search_str = search_str.replace("å", "a")
+    search_str = search_str.replace("ö", "o")
+    search_str = search_str.replace("é", "e")
+    search_str = search_str.replace("ü", "u")
+    search_str = search_str.replace("æ", "ae")
+    return search_str
+
+# remove special characters and useless stuff from file name (without suffix)
+def normalize_filename(filename):
+    filename = filename.replace("K ", "")
+    filename = filename.replace(" tg", "")
+    filename = filename.replace(" ", "_").lower()
+    filename = filename.replace("-", "_")
+    filename = filename.replace("ä", "a")
+    filename = filename.replace("å", "a")
+    filename = filename.replace("ö", "o")
+    filename = filename.replace("é", "e")
+    filename = filename.replace("æ", "ae")
+    filename = re.sub(r"_komm$|\[|\]", "", filename)
+    filename = filename.replace("_Academica", "")
+    filename = filename.replace("brev_komm_", "") # for letters
+    return filename
+
+# returns the set of all three character sequences in a string
+def get_trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+class FilenameIndex:
+    def __init__(self, filepath_list):
+        self.filepath_list = filepath_list
+        # normalized file names, in the same order as filepath_list
+        self.stems = [normalize_filename(path.stem) for path in filepath_list]
+        # trigram as key, set of positions of the file names containing it as value
+        self.trigram_index = {}
+        # number of different trigrams in each file name
+        self.trigram_counts = []
+        # file names too short to contain a trigram
+        self.short_stems = []
+        for position, stem in enumerate(self.stems):
+            trigrams = get_trigrams(stem)
+            self.trigram_counts.append(len(trigrams))
+            if len(trigrams) == 0:
+                self.short_stems.append(position)
+            for trigram in trigrams:
+                self.trigram_index.setdefault(trigram, set()).add(position)
+
+    # returns the positions of the file names that can match search_str, in the original order of filepath_list
+    # a partial match of 100 means that the shorter string is a part of the longer one, so a file name is a candidate if
+    # it contains all trigrams of search_str, or if all of its own trigrams are found in search_str
+    def get_candidates(self, search_str):
+        search_trigrams = get_trigrams(search_str)
+        if len(search_trigrams) == 0:
+            return range(len(self.stems))
+        # file names containing search_str
+        posting_lists = sorted((self.trigram_index.get(trigram, set()) for trigram in search_trigrams), key=len)
+        candidates = set(posting_lists[0]).intersection(*posting_lists[1:])
+        # file names contained in search_str
+        shared_counts = {}
+        for trigram in search_trigrams:
+            for position in self.trigram_index.get(trigram, ()):
+                shared_counts[position] = shared_counts.get(position, 0) + 1
+        for position, count in shared_counts.items():
+            if count == self.trigram_counts[position]:
+                candidates.add(position)
+        candidates.update(self.short_stems)
+        return sorted(candidates)
+
+    # returns the positions of the candidates that contain search_str or are contained in it, and the positions of the rest of the candidates
+    # an exact substring is the same as a partial match of 100, so the fuzzy comparison is only needed for the rest
+    def split_candidates(self, search_str):
+        substring_positions = []
+        other_positions = []
+        for position in self.get_candidates(search_str):
+            stem = self.stems[position]
+            if len(search_str) > 0 and len(stem) > 0 and (search_str in stem or stem in search_str):
+                substring_positions.append(position)
+            else:
+                other_positions.append(position)
+        return substring_positions, other_positions
+
+    # returns the positions of all file names that match search_str with a partial match of 100, in the original order
+    def find_all(self, search_str):
+        positions, other_positions = self.split_candidates(search_str)
+        positions.extend(position for position in other_positions if fuzz.partial_ratio(search_str, self.stems[position]) == 100)
+        return sorted(positions)
+
+# create the index for all file paths in a collection; done once per collection
+def create_filename_index(filepath_list):
+    return FilenameIndex(filepath_list)
+
+# returns the positions of the best scoring file names for each search string,
+# or an empty list if no file name has a partial match of 100
+# only the candidates from the trigram index that aren't substring matches are scored, all of them in one call to
+# rapidfuzz's cpdist, which compares the pairs in parallel
+def get_best_positions(search_strs, filename_index, workers):
+    best_positions = []
+    # (number of search string, position of file name) for each pair that needs to be scored
+    pairs = []
+    for number, search_str in enumerate(search_strs):
+        substring_positions, other_positions = filename_index.split_candidates(search_str)
+        best_positions.append(substring_positions)
+        pairs.extend((number, position) for position in other_positions)
+    if len(pairs) > 0:
+        scores = process.cpdist([search_strs[number] for number, position in pairs], [filename_index.stems[position] for number, position in pairs], scorer=fuzz.partial_ratio, workers=workers)
+        for (number, position), score in zip(pairs, scores):
+            if score == 100:
+                best_positions[number].append(position)
+    return [sorted(positions) for positions in best_positions]
+
+# match all publication names of a collection with the collection's file names at once
+# returns the matching file path (or None) for each publication name, in the same order as publication_names,
+# together with the ties (publication names matching several files equally well)
+# and the ambiguous files (file paths chosen for more than one publication)
+# when a name matches several files, the file name closest in length to the publication name is chosen; the rest of the ties are reported
+def match_pubnames_with_filenames(publication_names, filename_index, workers=-1):
+    search_strs = [normalize_publication_name(publication_name) for publication_name in publication_names]
+    best_positions = get_best_positions(search_strs, filename_index, workers)
+    matches = []
+    ties = []
+    publications_by_position = {}
+    for publication_name, search_str, positions in zip(publication_names, search_strs, best_positions):
+        if len(positions) == 0:
+            matches.append(None)
+            continue
+        positions = sorted(positions, key=lambda position: (abs(len(filename_index.stems[position]) - len(search_str)), position))
+        best_position = positions[0]
+        matches.append(filename_index.filepath_list[best_position])
+        if len(positions) > 1:
+            ties.append((publication_name, [filename_index.filepath_list[position] for position in positions]))
+        publications_by_position.setdefault(best_position, []).append(publication_name)
+    ambiguous_files = []
+    for position in sorted(publications_by_position.keys()):
+        if len(publications_by_position[position]) > 1:
+            ambiguous_files.append((filename_index.filepath_list[position], publications_by_position[position]))
+    return matches, ties, ambiguous_files
+
+# write ties and ambiguous files from match_pubnames_with_filenames to log file
+def write_ambiguous_matches_to_log(log_file, ties, ambiguous_files):
+    for publication_name, filepaths in ties:
+        log_file.write("PUBLICATION: " + publication_name + " TIED: " + ", ".join(path.as_posix() for path in filepaths) + "\n")
+    for filepath, publication_names in ambiguous_files:
+        log_file.write("FILE: " + filepath.as_posix() + " MATCHED BY: " + ", ".join(publication_names) + "\n")
@@ -0,0 +1,81 @@
+"""Fingerprint index for finding the files whose content is most similar to a given text.
+The text of each file is split into overlapping sequences of words (shingles), and a MinHash signature is computed from
+them. The share of equal values in two signatures estimates how similar the texts are. The signatures are divided into
+bands, and files are stored in buckets by the values in each band; files sharing a bucket with the searched text are the
+only ones compared with it, so a search doesn't have to go through all files in a collection."""
+
+import random
+import re
+import zlib
+
+# number of words in a shingle
+SHINGLE_SIZE = 3
+# number of hash functions in a signature; the signature is divided into BANDS bands of equal size
+NUM_PERMUTATIONS = 64
+BANDS = 16
+ROWS = NUM_PERMUTATIONS // BANDS
+# number of most similar files returned by get_nearest
+TOP_CANDIDATES = 3
+MERSENNE_PRIME = (1 << 61) - 1
+
+# the hash functions are (a * x + b) mod MERSENNE_PRIME; the seed is fixed so that signatures are the same in every run
+random_generator = random.Random(1)
+PERMUTATIONS = [(random_generator.randint(1, MERSENNE_PRIME - 1), random_generator.randint(0, MERSENNE_PRIME - 1)) for i in range(NUM_PERMUTATIONS)]
+
+# remove tags from xml string and return the set of hashed shingles of its words
+def get_shingles(text):
+    text = re.sub(r"<[^>]*>", " ", text)
+    words = re.findall(r"\w+", text.lower())
+    if len(words) < SHINGLE_SIZE:
+        return {zlib.crc32(" ".join(words).encode("utf-8"))} if words else set()
+    return {zlib.crc32(" ".join(words[i:i + SHINGLE_SIZE]).encode("utf-8")) for i in range(len(words) - SHINGLE_SIZE + 1)}
+
+# returns the MinHash signature of a set of shingles, or None if the set is empty
+def get_signature(shingles):
+    if len(shingles) == 0:
+        return None
+    return tuple(min((a * shingle + b) % MERSENNE_PRIME for shingle in shingles) for a, b in PERMUTATIONS)
+
+# returns the MinHash signature of the text of a file, or None if it has no words; stored in the TEI cache, see tei_cache.py
+def get_text_signature(text):
+    return get_signature(get_shingles(text))
+
+# returns the share of equal values in two signatures, which is an estimate of the similarity of the texts
+def estimate_similarity(signature, other_signature):
+    return sum(1 for value, other_value in zip(signature, other_signature) if value == other_value) / NUM_PERMUTATIONS
+
+# returns the keys of the buckets for a signature, one for each band
+def get_bucket_keys(signature):
+    return [(band, signature[band * ROWS:(band + 1) * ROWS]) for band in range(BANDS)]
+
+class FingerprintIndex:
+    # get_file_signature is a function returning the signature of the text of a file (see get_text_signature), e.g. from the TEI cache
+    def __init__(self, filepath_list, get_file_signature):
+        self.filepath_list = filepath_list
+        # signatures in the same order as filepath_list; None for files without text
+        self.signatures = []
+        # bucket key as key, list of positions of files with this key as value
+        self.buckets = {}
+        for position, path in enumerate(filepath_list):
+            signature = get_file_signature(path)
+            self.signatures.append(signature)
+            if signature is None:
+                continue
+            for key in get_bucket_keys(signature):
+                self.buckets.setdefault(key, []).append(position)
+
+    # returns the file paths of the files most similar to text, the most similar first
+    # only files sharing at least one bucket with text are considered
+    def get_nearest(self, text, count=TOP_CANDIDATES):
+        signature = get_text_signature(text)
+        if signature is None:
+            return []
+        candidates = set()
+        for key in get_bucket_keys(signature):
+            candidates.update(self.buckets.get(key, ()))
+        ranked = sorted(candidates, key=lambda position: (-estimate_similarity(signature, self.signatures[position]), position))
+        return [self.filepath_list[position] for position in ranked[:count]]
+
+# create the index for all file paths in a collection; done once per collection
+def create_fingerprint_index(filepath_list, get_file_signature):
+    return FingerprintIndex(filepath_list, get_file_signature)
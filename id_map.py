@@ -0,0 +1,144 @@
+"""Id maps connecting id:s in the old db with id:s created in the new db.
+An id map is stored as a binary file with two dense arrays of 32-bit integers, one indexed by old id (old -> new)
+and one indexed by new id (new -> old). 0 means that there is no mapping for an id, since all id:s are positive.
+The files are memory-mapped when read, so lookups in both directions are simple array indexing.
+The maps can be exported to the json format previously used in the id_dictionaries folder."""
+
+import json
+import mmap
+import struct
+import sys
+from array import array
+
+MAGIC = b"IDMAP01\n"
+# magic string followed by the lengths of the two arrays
+HEADER = struct.Struct("<8sII")
+# the arrays are as long as the largest id, so a much larger id is probably an error; the arrays would take 4 bytes per id
+MAX_ID = 10000000
+
+class IdMap:
+    def __init__(self, old_to_new, new_to_old, mapped_file=None):
+        self.old_to_new = old_to_new
+        self.new_to_old = new_to_old
+        self.mapped_file = mapped_file
+
+    # look up new id using old id; returns default if the old id has no new id
+    def get(self, old_id, default=None):
+        index = to_index(old_id)
+        if index is None or index >= len(self.old_to_new) or self.old_to_new[index] == 0:
+            return default
+        return self.old_to_new[index]
+
+    # look up old id using new id; returns default if the new id has no old id
+    def old_id(self, new_id, default=None):
+        index = to_index(new_id)
+        if index is None or index >= len(self.new_to_old) or self.new_to_old[index] == 0:
+            return default
+        return self.new_to_old[index]
+
+    def __getitem__(self, old_id):
+        new_id = self.get(old_id)
+        if new_id is None:
+            raise KeyError(old_id)
+        return new_id
+
+    def __contains__(self, old_id):
+        return self.get(old_id) is not None
+
+    # yields (old id, new id) for all mappings, ordered by old id
+    def items(self):
+        for old_id, new_id in enumerate(self.old_to_new):
+            if new_id != 0:
+                yield old_id, new_id
+
+    def keys(self):
+        return (old_id for old_id, new_id in self.items())
+
+    def __len__(self):
+        return sum(1 for item in self.items())
+
+    def close(self):
+        if self.mapped_file is not None:
+            self.old_to_new.release()
+            self.new_to_old.release()
+            self.mapped_file.close()
+            self.mapped_file = None
+
+# id:s are used as array indexes; the old id dictionaries had id:s as strings, so strings of digits are accepted too
+def to_index(id):
+    if isinstance(id, str) and id.isdigit():
+        id = int(id)
+    if not isinstance(id, int) or isinstance(id, bool) or id <= 0:
+        return None
+    return id
+
+# returns the id as an array index; raises ValueError naming the id and the table if it can't be used in an id map
+def validate_id(id, id_type, table):
+    index = to_index(id)
+    if index is None:
+        raise ValueError(table + ": " + id_type + " id " + repr(id) + " is not a positive integer")
+    if index > MAX_ID:
+        raise ValueError(table + ": " + id_type + " id " + repr(id) + " is larger than " + str(MAX_ID))
+    return index
+
+# create an id map in memory from a dictionary with old id:s as keys and new id:s as values
+# table is the name of the table the id:s belong to, used in the error message if an id isn't valid
+def create_id_map(id_dictionary, table="id map"):
+    pairs = [(validate_id(old_id, "old", table), validate_id(new_id, "new", table)) for old_id, new_id in id_dictionary.items()]
+    old_length = max((old_id for old_id, new_id in pairs), default=0) + 1
+    new_length = max((new_id for old_id, new_id in pairs), default=0) + 1
+    old_to_new = array("i", bytes(4 * old_length))
+    new_to_old = array("i", bytes(4 * new_length))
+    for old_id, new_id in pairs:
+        old_to_new[old_id] = new_id
+        new_to_old[new_id] = old_id
+    return IdMap(old_to_new, new_to_old)
+
+# write dictionary with old id:s as keys and new id:s as values to a binary id map file
+# table is the name of the table the id:s belong to; if it isn't given, the file name is used in error messages
+def write_id_map(id_dictionary, filename, table=None):
+    id_map = create_id_map(id_dictionary, table or filename)
+    old_to_new = id_map.old_to_new
+    new_to_old = id_map.new_to_old
+    # the file is always little-endian
+    if sys.byteorder != "little":
+        old_to_new.byteswap()
+        new_to_old.byteswap()
+    with open(filename, "wb") as output_file:
+        output_file.write(HEADER.pack(MAGIC, len(old_to_new), len(new_to_old)))
+        output_file.write(old_to_new.tobytes())
+        output_file.write(new_to_old.tobytes())
+        print("Id map written to file", filename)
+
+# read id map file; the arrays are used directly from the memory-mapped file
+def read_id_map(filename):
+    with open(filename, "rb") as source_file:
+        mapped_file = mmap.mmap(source_file.fileno(), 0, access=mmap.ACCESS_READ)
+    magic, old_length, new_length = HEADER.unpack_from(mapped_file)
+    if magic != MAGIC:
+        mapped_file.close()
+        raise ValueError(filename + " is not an id map file")
+    old_start = HEADER.size
+    new_start = old_start + 4 * old_length
+    # memoryview.cast uses the native byte order, so big-endian machines need a byteswapped copy instead
+    if sys.byteorder != "little" or array("i").itemsize != 4:
+        old_to_new = array("i", mapped_file[old_start:new_start])
+        new_to_old = array("i", mapped_file[new_start:new_start + 4 * new_length])
+        old_to_new.byteswap()
+        new_to_old.byteswap()
+        mapped_file.close()
+        return IdMap(old_to_new, new_to_old)
+    buffer = memoryview(mapped_file)
+    old_to_new = buffer[old_start:new_start].cast("i")
+    new_to_old = buffer[new_start:new_start + 4 * new_length].cast("i")
+    buffer.release()
+    return IdMap(old_to_new, new_to_old, mapped_file)
+
+# export id map file to json, with old id:s (as strings) as keys and new id:s as values, like the old id dictionaries
+def export_id_map_to_json(filename, json_filename):
+    id_map = read_id_map(filename)
+    json_dict = json.dumps(dict(id_map.items()))
+    id_map.close()
+    with open(json_filename, "w", encoding="utf-8") as output_file:
+        output_file.write(json_dict)
+        print("Dictionary written to file", json_filename)
@@ -0,0 +1,62 @@
+"""Ledger of the results of the matching scripts, such as matched and unmatched publications, versions and manuscripts.
+Each result is appended as one line of JSON to a ledger file in the logs folder as soon as it is known, with the stage
+of the matching, the status (e.g. matched or unmatched) and fields like id:s, names, file paths and scores.
+File paths matched more than once are found while the results are recorded. The text logs and the match percentages
+are written from the ledger afterwards, so the scripts don't need to read their own logs again.
+Each matching script creates one ledger in main(), records every match or miss in it in the main process, and writes its
+text logs from it when all collections have been matched."""
+
+import json
+
+class MatchLedger:
+    def __init__(self, filename):
+        self.filename = filename
+        self.ledger_file = open(filename, "w", encoding="utf-8")
+        self.entries = []
+        # matched file path as key, list of entries matching it as value
+        self.matched_paths = {}
+        # file paths matched more than once, in the order they were first matched again
+        self.duplicate_paths = []
+
+    # append a result to the ledger; if the status is matched and there is a path, check if the path has been matched before
+    def record(self, stage, status, **fields):
+        entry = {"stage": stage, "status": status}
+        entry.update(fields)
+        self.ledger_file.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        self.entries.append(entry)
+        if status == "matched" and entry.get("path") is not None:
+            path_entries = self.matched_paths.setdefault(entry["path"], [])
+            path_entries.append(entry)
+            if len(path_entries) == 2:
+                self.duplicate_paths.append(entry["path"])
+        return entry
+
+    # returns the entries with the given stage and status, in the order they were recorded; None matches all
+    def get_entries(self, stage=None, status=None):
+        return [entry for entry in self.entries if (stage is None or entry["stage"] == stage) and (status is None or entry["status"] == status)]
+
+    # returns a list of (path, entries) for all file paths matched more than once
+    def get_duplicates(self):
+        return [(path, self.matched_paths[path]) for path in self.duplicate_paths]
+
+    # returns the statistics line written at the end of the logs, e.g. "Versions matched: 10/12. Percentage matched: 83.33"
+    def get_match_summary(self, stage, label):
+        stage_entries = self.get_entries(stage)
+        match_count = sum(1 for entry in stage_entries if entry["status"] == "matched")
+        return label + " matched: " + str(match_count) + "/" + str(len(stage_entries)) + ". Percentage matched: " + str(match_count/len(stage_entries)*100)
+
+    # write a text log with one line (or more) for each entry with the given stage and status, created by format_entry
+    def write_text_log(self, filename, format_entry, stage=None, status=None, header="", footer=""):
+        with open(filename, "w", encoding="utf-8") as output_file:
+            output_file.write(header)
+            for entry in self.get_entries(stage, status):
+                output_file.write(format_entry(entry))
+            output_file.write(footer)
+
+    def close(self):
+        self.ledger_file.close()
+
+# read the entries of a ledger file written earlier
+def read_ledger(filename):
+    with open(filename, encoding="utf-8") as source_file:
+        return [json.loads(line) for line in source_file if line.strip()]
@@ -3,7 +3,14 @@ Created by Anna Movall and Jonas Lillqvist in January 2020"""
 
 import mysql.connector
 import psycopg2
-import json
+
+from bulk_load import insert_rows_with_id_mapping
+from bulk_load import copy_rows
+from source_reader import stream_rows
+from id_map import read_id_map
+from id_map import write_id_map
+from id_map import export_id_map_to_json
+from match_ledger import MatchLedger
 
 conn_old_db = mysql.connector.connect(
     host="",
@@ -22,51 +29,31 @@ conn_new_db = psycopg2.connect(
 )
 cursor_new = conn_new_db.cursor()
 
-def read_dict_from_file(filename):
-    with open(filename, encoding="utf-8") as source_file:
-        json_content = json.load(source_file)
-        return json_content
-
-def write_dict_to_file(dictionary, filename):
-    json_dict = json.dumps(dictionary)
-    with open(filename, "w", encoding="utf-8") as output_file:
-        output_file.write(json_dict)
-        print("Dictionary written to file", filename)
-
-def write_text_to_file(text, filename):
-    with open(filename, "w", encoding="utf-8") as output_file:
-        output_file.write(text)
-        print("Text written to file", filename)
+# write the excluded tuples recorded in the ledger to a text log
+def write_excluded_tuples_to_file(ledger, filename):
+    ledger.write_text_log(filename, lambda entry: "tuple with " + entry["old_id_name"] + ": " + str(entry["old_id"]) + " skipped\n", "publication_facsimile", "excluded")
+    print("Text written to file", filename)
 
 def create_facsimile_collection():
     fetch_query = """SELECT publication_id, title, description, pages, pre_page_count, pages_comment, facs_url FROM facsimiles"""
-    cursor_old.execute(fetch_query)
-    old_tuples = cursor_old.fetchall()
-    insert_query = """INSERT INTO publication_facsimile_collection(title, description, number_of_pages, start_page_number, page_comment, external_url) VALUES (%s, %s, %s, %s, %s, %s) RETURNING id"""
-    facsimile_coll_id_dict = {}
-    for tuple in old_tuples:
-        old_id = tuple[0]
-        values_to_insert = (tuple[1], tuple[2], tuple[3], tuple[4], tuple[5], tuple[6])
-        cursor_new.execute(insert_query, values_to_insert)
-        new_id = cursor_new.fetchone()[0]
-        facsimile_coll_id_dict[old_id] = new_id
+    old_tuples = stream_rows(conn_old_db, fetch_query) # rows are read from the old db as they are needed
+    columns = ("title", "description", "number_of_pages", "start_page_number", "page_comment", "external_url")
+    # old id first, then the values to insert
+    rows = ((tuple[0], tuple[1:7]) for tuple in old_tuples)
+    facsimile_coll_id_dict = insert_rows_with_id_mapping(cursor_new, "publication_facsimile_collection", columns, rows)
     conn_new_db.commit()
     return facsimile_coll_id_dict
 
-# this table connects publications (= texts) and facsimiles
-def create_publication_facsimile(publication_id_dict, facsimile_coll_id_dict, manuscript_id_dict):
-    fetch_query = """SELECT publications_id, section_id, facs_id, page_nr, priority, type, ms_id FROM facsimile_publications"""
-    cursor_old.execute(fetch_query)
-    old_tuples = cursor_old.fetchall()
-    insert_query = """INSERT INTO publication_facsimile(publication_id, section_id, publication_facsimile_collection_id, page_nr, priority, type, publication_manuscript_id) VALUES (%s, %s, %s, %s, %s, %s, %s)"""
-    excluded_tuples = "" # for saving info about tuples in the old db that are excluded from migration
+# yields the values to insert into publication_facsimile for each tuple in the old db that is migrated
+# tuples that are excluded from migration are recorded in the ledger
+def transform_facsimile_publications(old_tuples, publication_id_map, facsimile_coll_id_map, manuscript_id_map, ledger):
     for tuple in old_tuples:
         old_publication_id = tuple[0]
         # do not include tuples which refer to unpublished texts:
-        if str(old_publication_id) not in publication_id_dict.keys():
-            excluded_tuples += "tuple with old_publication_id: " + str(old_publication_id) + " skipped \n"
+        if old_publication_id not in publication_id_map:
+            ledger.record("publication_facsimile", "excluded", old_id_name="old_publication_id", old_id=old_publication_id)
             continue
-        publication_id = publication_id_dict[str(old_publication_id)] #get new id from dictionary using old id as key; this value is a string in the json dictionary file
+        publication_id = publication_id_map[old_publication_id] # get new id from id map using old id
         section_id = tuple[1]
         # the new db requires an int value for section_id and does not accept null
         if section_id is None:
@@ -74,36 +61,47 @@ def create_publication_facsimile(publication_id_dict, facsimile_coll_id_dict, ma
         if isinstance(section_id, str): # check that the old value is a string before making replace, to avoid error
             section_id = int(section_id.replace("ch", "")) # section_id is of type int in new db
         old_facsimile_id = tuple[2]
-        if str(old_facsimile_id) not in facsimile_coll_id_dict.keys(): # skip tuples which refer to unpublished facsimiles
-            excluded_tuples += "tuple with old_facsimile_id: " + str(old_facsimile_id) + " skipped\n"
+        if old_facsimile_id not in facsimile_coll_id_map: # skip tuples which refer to unpublished facsimiles
+            ledger.record("publication_facsimile", "excluded", old_id_name="old_facsimile_id", old_id=old_facsimile_id)
             continue
-        facsimile_id = facsimile_coll_id_dict[str(tuple[2])]
+        facsimile_id = facsimile_coll_id_map[old_facsimile_id]
         page_nr = tuple[3]
         priority = tuple[4]
         type = tuple[5]
         old_manuscript_id = tuple[6]
         # only NULL, 0 or values in the dictionary are allowed for ms_id; otherwise the tuple should be skipped because it refers to an unpublished manuscript
-        if old_manuscript_id is not None and old_manuscript_id != 0 and str(old_manuscript_id) not in manuscript_id_dict.keys():
-            excluded_tuples += "tuple with old_ms_id: " + str(old_manuscript_id) + " skipped\n"
+        if old_manuscript_id is not None and old_manuscript_id != 0 and old_manuscript_id not in manuscript_id_map:
+            ledger.record("publication_facsimile", "excluded", old_id_name="old_ms_id", old_id=old_manuscript_id)
             continue
-        if str(old_manuscript_id) in manuscript_id_dict.keys():
-            manuscript_id = manuscript_id_dict[str(old_manuscript_id)] # get new id from dictionary using old id as key
+        if old_manuscript_id in manuscript_id_map:
+            manuscript_id = manuscript_id_map[old_manuscript_id] # get new id from id map using old id
         elif old_manuscript_id == 0:
             manuscript_id = None # use NULL if old value is 0
         else:
             manuscript_id = None # otherwise the old value is NULL, which is preserved
-        values_to_insert = (publication_id, section_id, facsimile_id, page_nr, priority, type, manuscript_id)
-        cursor_new.execute(insert_query, values_to_insert)
+        yield (publication_id, section_id, facsimile_id, page_nr, priority, type, manuscript_id)
+
+# this table connects publications (= texts) and facsimiles
+# the rows don't need any id:s back, so they are streamed into the table with one COPY
+def create_publication_facsimile(publication_id_map, facsimile_coll_id_map, manuscript_id_map):
+    fetch_query = """SELECT publications_id, section_id, facs_id, page_nr, priority, type, ms_id FROM facsimile_publications"""
+    old_tuples = stream_rows(conn_old_db, fetch_query) # rows are read from the old db as they are needed
+    columns = ("publication_id", "section_id", "publication_facsimile_collection_id", "page_nr", "priority", "type", "publication_manuscript_id")
+    ledger = MatchLedger("logs/excluded_facsimile_publications_tuples.jsonl") # for saving info about tuples in the old db that are excluded from migration
+    rows = transform_facsimile_publications(old_tuples, publication_id_map, facsimile_coll_id_map, manuscript_id_map, ledger)
+    copy_rows(cursor_new, "publication_facsimile", columns, rows)
     conn_new_db.commit()
-    write_text_to_file(excluded_tuples, "logs/excluded_facsimile_publications_tuples.txt")
+    ledger.close()
+    write_excluded_tuples_to_file(ledger, "logs/excluded_facsimile_publications_tuples.txt")
 
 def main():
     facsimile_coll_id_dict = create_facsimile_collection()
-    write_dict_to_file(facsimile_coll_id_dict, "id_dictionaries/facsimile_coll_ids.json")
-    publication_id_dict = read_dict_from_file("id_dictionaries/publication_ids.json")
-    facsimile_coll_id_dict = read_dict_from_file("id_dictionaries/facsimile_coll_ids.json")
-    manuscript_id_dict = read_dict_from_file("id_dictionaries/manuscript_ids.json")
-    create_publication_facsimile(publication_id_dict, facsimile_coll_id_dict, manuscript_id_dict)
+    write_id_map(facsimile_coll_id_dict, "id_dictionaries/facsimile_coll_ids.idmap", "publication_facsimile_collection")
+    export_id_map_to_json("id_dictionaries/facsimile_coll_ids.idmap", "id_dictionaries/facsimile_coll_ids.json")
+    publication_id_map = read_id_map("id_dictionaries/publication_ids.idmap")
+    facsimile_coll_id_map = read_id_map("id_dictionaries/facsimile_coll_ids.idmap")
+    manuscript_id_map = read_id_map("id_dictionaries/manuscript_ids.idmap")
+    create_publication_facsimile(publication_id_map, facsimile_coll_id_map, manuscript_id_map)
     cursor_new.close()
     conn_new_db.close()
     conn_old_db.close()
@@ -3,7 +3,11 @@ Created by Anna Movall and Jonas Lillqvist in January 2020"""
 
 import mysql.connector
 import psycopg2
-import json
+
+from bulk_load import insert_rows_with_id_mapping
+from id_map import write_id_map
+from id_map import export_id_map_to_json
+from source_reader import stream_rows
 
 PROJECT_NAME = ""
 
@@ -32,12 +36,8 @@ def create_project(PROJECT_NAME):
     conn_new_db.commit()
     return id
 
-def create_collection(project_id):
-    fetch_query = """SELECT zts_id, zts_title, zts_lansering FROM publications_zts"""
-    cursor_old.execute(fetch_query)
-    old_tuples = cursor_old.fetchall()
-    insert_query = """INSERT INTO publication_collection(project_id, published, name, legacy_id) VALUES (%s, %s, %s, %s) RETURNING id"""
-    id_dictionary = {}
+# yields old id and values to insert into publication_collection for each collection that is migrated
+def transform_collections(old_tuples, project_id):
     for tuple in old_tuples:
         old_id = tuple[0]
         title = tuple[1]
@@ -45,19 +45,19 @@ def create_collection(project_id):
         values_to_insert = (project_id, lansering, title, old_id)
         # don't include Brev, which has been split into two new collections instead (zts_id 30 and 31) and don't include the old collection of Lfb
         if old_id != 15 and old_id != 9:
-            cursor_new.execute(insert_query, values_to_insert)
-            new_id = cursor_new.fetchone()[0]
-            id_dictionary[old_id] = new_id
+            yield old_id, values_to_insert
+
+def create_collection(project_id):
+    fetch_query = """SELECT zts_id, zts_title, zts_lansering FROM publications_zts"""
+    old_tuples = stream_rows(conn_old_db, fetch_query) # rows are read from the old db as they are needed
+    columns = ("project_id", "published", "name", "legacy_id")
+    # the rows are inserted in batches; the dictionary maps old id:s to the new id:s reserved for them
+    id_dictionary = insert_rows_with_id_mapping(cursor_new, "publication_collection", columns, transform_collections(old_tuples, project_id))
     conn_new_db.commit()
     return id_dictionary
 
-def create_publication(collection_id_dictionary):
-    fetch_query = """SELECT p_id, p_title, p_zts_id, p_coll_id, p_identifier, p_maskindatum, p_genre FROM publications"""
-    cursor_old.execute(fetch_query)
-    old_tuples = cursor_old.fetchall()
-    insert_query = """INSERT INTO publication(name, publication_collection_id, legacy_id, original_publication_date, genre) VALUES (%s, %s, %s, %s, %s) RETURNING id"""
-     # old ids saved as keys with new ids as values; needed for connecting manuscripts, versions and facsimiles to publications.
-    id_dictionary = {}
+# yields old id and values to insert into publication for each publication that is migrated
+def transform_publications(old_tuples, collection_id_dictionary):
     for tuple in old_tuples:
         old_id = tuple[0]
         title = tuple[1]
@@ -82,37 +82,33 @@ def create_publication(collection_id_dictionary):
             original_date = original_date.replace("-00", "-XX").strip() # replace mysql-dates in format -00-00 with -XX-XX
         genre = tuple[6]
         values_to_insert = (title, collection_id, old_text_id, original_date, genre)
-        cursor_new.execute(insert_query, values_to_insert)
-        new_id = cursor_new.fetchone()[0]
-        id_dictionary[old_id] = new_id
-    conn_new_db.commit() 
-    return id_dictionary
+        yield old_id, values_to_insert
 
-def write_dict_to_file(dictionary, filename):
-    json_dict = json.dumps(dictionary)
-    with open(filename, "w", encoding="utf-8") as output_file:
-        output_file.write(json_dict)
-        print("Dictionary written to file", filename)
+def create_publication(collection_id_dictionary):
+    fetch_query = """SELECT p_id, p_title, p_zts_id, p_coll_id, p_identifier, p_maskindatum, p_genre FROM publications"""
+    old_tuples = stream_rows(conn_old_db, fetch_query) # rows are read from the old db as they are needed
+    columns = ("name", "publication_collection_id", "legacy_id", "original_publication_date", "genre")
+    # old ids saved as keys with new ids as values; needed for connecting manuscripts, versions and facsimiles to publications.
+    id_dictionary = insert_rows_with_id_mapping(cursor_new, "publication", columns, transform_publications(old_tuples, collection_id_dictionary))
+    conn_new_db.commit()
+    return id_dictionary
 
 # set value of published in table publication according to the corresponding value from table publication_collection;
 # the field does not exist in the old table publications, so it can't be transferred directly
 def set_published_in_publication(project_id):
-    fetch_query = """SELECT id, published FROM publication_collection WHERE project_id=%s"""
-    cursor_new.execute(fetch_query, (project_id,))
-    tuples = cursor_new.fetchall()
-    for tuple in tuples:
-        collection_id = tuple[0]
-        published = tuple[1]
-        update_query = """UPDATE publication SET published=%s WHERE publication_collection_id=%s"""
-        cursor_new.execute(update_query, (published, collection_id))
+    # one update for all collections in the project, joining publication with publication_collection
+    update_query = """UPDATE publication SET published = publication_collection.published FROM publication_collection WHERE publication.publication_collection_id = publication_collection.id AND publication_collection.project_id = %s"""
+    cursor_new.execute(update_query, (project_id,))
     conn_new_db.commit()
 
 def main():
     project_id = create_project(PROJECT_NAME)
     collection_ids = create_collection(project_id)
-    write_dict_to_file(collection_ids, "id_dictionaries/collection_ids.json")
+    write_id_map(collection_ids, "id_dictionaries/collection_ids.idmap", "publication_collection")
+    export_id_map_to_json("id_dictionaries/collection_ids.idmap", "id_dictionaries/collection_ids.json")
     publication_ids = create_publication(collection_ids)
-    write_dict_to_file(publication_ids, "id_dictionaries/publication_ids.json")
+    write_id_map(publication_ids, "id_dictionaries/publication_ids.idmap", "publication")
+    export_id_map_to_json("id_dictionaries/publication_ids.idmap", "id_dictionaries/publication_ids.json")
     set_published_in_publication(project_id)
     conn_new_db.close()
     cursor_new.close()
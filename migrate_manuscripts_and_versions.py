@@ -3,7 +3,12 @@ Created by Anna Movall and Jonas Lillqvist in January 2020"""
 
 import mysql.connector
 import psycopg2
-import json
+
+from bulk_load import insert_rows_with_id_mapping
+from id_map import read_id_map
+from id_map import write_id_map
+from id_map import export_id_map_to_json
+from source_reader import stream_rows
 
 conn_old_db = mysql.connector.connect(
     host="",
@@ -22,24 +27,15 @@ conn_new_db = psycopg2.connect(
 )
 cursor_new = conn_new_db.cursor()
 
-def read_dict_from_file(filename):
-    with open(filename, encoding="utf-8") as source_file:
-        json_content = json.load(source_file)
-        return json_content
-
-def create_publication_manuscript(publication_id_dict):
-    fetch_query = """SELECT m_id, m_publication_id, m_title, m_sort, m_filename, m_type, m_section_id FROM manuscripts"""
-    cursor_old.execute(fetch_query)
-    old_tuples = cursor_old.fetchall()
-    insert_query = """INSERT INTO publication_manuscript(publication_id, name, sort_order, legacy_id, type, section_id) VALUES (%s, %s, %s, %s, %s, %s) RETURNING id"""
-    manuscript_id_dictionary = {}
+# yields old id and values to insert into publication_manuscript for each manuscript that is migrated
+def transform_manuscripts(old_tuples, publication_id_map):
     for tuple in old_tuples:
         # if a manuscript does not belong to a published publication, it should not be migrated
         old_publication_id = tuple[1]
-        if str(old_publication_id) not in publication_id_dict.keys():
+        if old_publication_id not in publication_id_map:
             continue
         old_id = tuple[0]
-        publication_id = publication_id_dict[str(old_publication_id)] # get new id from dictionary using old id as key; this value is a string in the json dictionary file
+        publication_id = publication_id_map[old_publication_id] # get new id from id map using old id
         title = tuple[2]
         sort_order = tuple[3]
         legacy_id = tuple[4]
@@ -48,25 +44,25 @@ def create_publication_manuscript(publication_id_dict):
         if section_id is not None:
             section_id = int(section_id.replace("ch", "")) # remove ch, the id is an int in the new db
         values_to_insert = (publication_id, title, sort_order, legacy_id, type, section_id)
-        cursor_new.execute(insert_query, values_to_insert)
-        new_id = cursor_new.fetchone()[0]
-        manuscript_id_dictionary[old_id] = new_id
+        yield old_id, values_to_insert
+
+def create_publication_manuscript(publication_id_map):
+    fetch_query = """SELECT m_id, m_publication_id, m_title, m_sort, m_filename, m_type, m_section_id FROM manuscripts"""
+    old_tuples = stream_rows(conn_old_db, fetch_query) # rows are read from the old db as they are needed
+    columns = ("publication_id", "name", "sort_order", "legacy_id", "type", "section_id")
+    manuscript_id_dictionary = insert_rows_with_id_mapping(cursor_new, "publication_manuscript", columns, transform_manuscripts(old_tuples, publication_id_map))
     conn_new_db.commit()
     return manuscript_id_dictionary
 
-def create_publication_version(publication_id_dict):
-    fetch_query = """SELECT v_id, v_publication_id, v_title, v_sort, v_type, v_filename, v_section_id FROM versions"""
-    cursor_old.execute(fetch_query)
-    old_tuples = cursor_old.fetchall()
-    insert_query = """INSERT INTO publication_version (publication_id, name, sort_order, type, legacy_id, section_id) VALUES (%s, %s, %s, %s, %s, %s) RETURNING id"""
-    version_id_dict = {}
+# yields old id and values to insert into publication_version for each version that is migrated
+def transform_versions(old_tuples, publication_id_map):
     for tuple in old_tuples:
         old_publication_id = tuple[1]
         # if a version does not belong to a published publication, it should not be migrated
-        if str(old_publication_id) not in publication_id_dict.keys():
+        if old_publication_id not in publication_id_map:
             continue
         old_id = tuple[0]
-        publication_id = publication_id_dict[str(old_publication_id)] # get new id from dictionary using old id as key; this value is a string in the json dictionary file
+        publication_id = publication_id_map[old_publication_id] # get new id from id map using old id
         title = tuple[2]
         sort_order = tuple[3]
         type = tuple[4]
@@ -75,24 +71,24 @@ def create_publication_version(publication_id_dict):
         if section_id is not None:
             section_id = int(section_id.replace("ch", "")) # remove ch, the id is an int in the new db
         values_to_insert = (publication_id, title, sort_order, type, legacy_id, section_id)
-        cursor_new.execute(insert_query, values_to_insert)
-        new_id = cursor_new.fetchone()[0]
-        version_id_dict[old_id] = new_id
+        yield old_id, values_to_insert
+
+def create_publication_version(publication_id_map):
+    fetch_query = """SELECT v_id, v_publication_id, v_title, v_sort, v_type, v_filename, v_section_id FROM versions"""
+    old_tuples = stream_rows(conn_old_db, fetch_query) # rows are read from the old db as they are needed
+    columns = ("publication_id", "name", "sort_order", "type", "legacy_id", "section_id")
+    version_id_dict = insert_rows_with_id_mapping(cursor_new, "publication_version", columns, transform_versions(old_tuples, publication_id_map))
     conn_new_db.commit()
     return version_id_dict
 
-def write_dict_to_file(dictionary, filename):
-    json_dict = json.dumps(dictionary)
-    with open(filename, "w", encoding="utf-8") as output_file:
-        output_file.write(json_dict)
-        print("Dictionary written to file.")
-
 def main():
-    publication_id_dict = read_dict_from_file("id_dictionaries/publication_ids.json")
-    manuscript_id_dict = create_publication_manuscript(publication_id_dict)
-    write_dict_to_file(manuscript_id_dict, "id_dictionaries/manuscript_ids.json")
-    version_id_dict = create_publication_version(publication_id_dict)
-    write_dict_to_file(version_id_dict, "id_dictionaries/version_ids.json")
+    publication_id_map = read_id_map("id_dictionaries/publication_ids.idmap")
+    manuscript_id_dict = create_publication_manuscript(publication_id_map)
+    write_id_map(manuscript_id_dict, "id_dictionaries/manuscript_ids.idmap", "publication_manuscript")
+    export_id_map_to_json("id_dictionaries/manuscript_ids.idmap", "id_dictionaries/manuscript_ids.json")
+    version_id_dict = create_publication_version(publication_id_map)
+    write_id_map(version_id_dict, "id_dictionaries/version_ids.idmap", "publication_version")
+    export_id_map_to_json("id_dictionaries/version_ids.idmap", "id_dictionaries/version_ids.json")
     conn_new_db.close()
     cursor_new.close()
     conn_old_db.close()
@@ -0,0 +1,37 @@
+"""Helper functions for running the file path matching of several collections in parallel.
+The matching for each collection (walking the folders, parsing XML and fuzzy matching) is done in a pool of worker
+processes. The results are returned to the main process in the same order as the collections, and the main process
+does all the db writes and log writing, so the output is the same as when the collections are processed one by one.
+The function that matches one collection (match_collection in the scripts) runs in a worker process when a script is
+run with --workers N, so it must not use the db connections or write the logs."""
+
+import argparse
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+# read the number of worker processes from the command line: --workers N
+# the default is 1, which means that the collections are processed one by one in the main process
+def get_worker_count(description=None):
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument("--workers", type=int, default=1, help="number of worker processes used for matching collections")
+    args = parser.parse_args()
+    return max(args.workers, 1)
+
+# the number of threads used by rapidfuzz for the score matrix of one collection
+# with several worker processes, each of them computes its score matrix in one thread; otherwise all cores are used
+def get_score_workers(workers):
+    if workers == 1:
+        return -1
+    return 1
+
+# call match_function for each task and yield the results in the same order as the tasks
+# the workers are forked, so they don't import the script again; the scripts connect to the databases when imported
+# the workers never use the db connections, they only return match results
+def map_collections(match_function, tasks, workers):
+    if workers == 1:
+        for task in tasks:
+            yield match_function(task)
+        return
+    context = multiprocessing.get_context("fork")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context) as executor:
+        yield from executor.map(match_function, tasks)
@@ -0,0 +1,22 @@
+"""Helper functions for reading rows from the old (MySQL) database as a stream.
+The rows are fetched in chunks from an unbuffered cursor instead of loading whole tables with fetchall."""
+
+# number of rows fetched from the old db at a time
+FETCH_SIZE = 1000
+
+# run a select query in the old db and yield the resulting rows one at a time
+# the cursor is unbuffered, so the server sends the rows as they are fetched and at most fetch_size rows are held in memory
+# no other query can be run on the same connection until all the rows have been read
+def stream_rows(connection, fetch_query, values=None, fetch_size=FETCH_SIZE):
+    cursor = connection.cursor(buffered=False)
+    cursor.execute(fetch_query, values)
+    try:
+        rows = cursor.fetchmany(fetch_size)
+        while rows:
+            yield from rows
+            rows = cursor.fetchmany(fetch_size)
+    finally:
+        # if the caller stops early, read the rest of the result so that the connection can be used again
+        while cursor.fetchmany(fetch_size):
+            pass
+        cursor.close()
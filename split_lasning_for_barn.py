@@ -1,22 +1,18 @@
 """Script for splitting the 8 large xml files of Läsning för barn so that each story is in a separate file. The script also creates a csv file mapping legacy id:s with the newly created file paths.
+The large files can be split in parallel: --workers N
 Created by Anna Movall and Jonas Lillqvist in March 2020"""
 
 import os
-from pathlib import Path
 import re
-from bs4 import BeautifulSoup
 
-XML_OUTPUT_FOLDER = "Lfb_split_files/"
+from csv_registry import get_csv_list
+from file_inventory import create_file_list
+from parallel import get_worker_count
+from parallel import map_collections
+from tei_emitter import compile_template, FileWriterPool
+from tei_splitter import iter_elements_by_id
 
-# creates a list from csv file with publication name, div id, publication id and legacy id
-def create_list_from_csv(filename):
-    with open(filename, "r", encoding="utf-8") as source_file:
-        lfb_list = []
-        for line in source_file:
-            row = line.rstrip()
-            elements = row.split(";")
-            lfb_list.append(elements)
-        return lfb_list
+XML_OUTPUT_FOLDER = "Lfb_split_files/"
 
 # creates a folder for each of the 8 parts
 def create_directories(directory_name_base):
@@ -25,37 +21,32 @@ def create_directories(directory_name_base):
         if not os.path.exists(dir_name):
             os.makedirs(dir_name)
 
-# creates a path object for a folder from a given filepath string, saves all paths to files found in this folder or subfolders in a list
-def create_file_list(filepath):
-    path = Path(filepath)
-    filelist = []
-    iterate_through_folders(path, filelist)
-    return filelist
-
-# iterates through folders recursively and appends filepaths to list
-def iterate_through_folders(path, filelist):
-    for content in path.iterdir():
-        if content.is_dir():
-            iterate_through_folders(content, filelist)
-        elif content.suffix == ".xml":
-            filelist.append(content)
-
-# save content of each large file in a dictionary with its part nr as key
-def read_file_content_to_dict(large_file_list):
-    part_content_dict = {}
-    i = 1
-    for path in large_file_list:
-        with path.open(encoding="utf-8") as source_file:
-            content = source_file.read()
-            part_content_dict[i] = content
-            i += 1
-    return part_content_dict
+# split one large file: the divs are read one at a time and a file is created for each of them as soon as it has been read
+# task is (path of the large file, list of (div id, output file path, title)); returns the div id:s that weren't found
+def split_part(task):
+    path, part_rows = task
+    template = content_template()
+    # div id as key, list of (output file path, title) as value
+    outputs = {}
+    for div_id, output_file_path, name in part_rows:
+        outputs.setdefault(div_id, []).append((output_file_path, name))
+    writer_pool = FileWriterPool()
+    for div_id, div_content in iter_elements_by_id(str(path), outputs.keys()):
+        # create file content using template xml, div_content and title from list
+        for output_file_path, name in outputs.pop(div_id):
+            writer_pool.write(output_file_path, template.render(title=name, content=div_content))
+    writer_pool.close()
+    return list(outputs.keys())
 
 # create a file for each story in the right folder, using the story's name as basis for file name (transform it suitably)
 # create file content using template xml and insert the right div from source files
 # and title from lfb_list
-def create_files(lfb_list, directory_name_base, part_content_dict):
-    # one file is created for each item in the list
+# each large file is split in a worker process; the rows of the list are then updated in their original order
+# if several rows get the same file name, the file is created from the last of them, and the duplicates are printed
+def create_files(lfb_list, directory_name_base, large_file_list, workers):
+    # part nr as key, dictionary with output file path as key and (div id, output file path, title) as value
+    part_rows = {}
+    new_file_paths = []
     for row in lfb_list:
         name = row[0]
         whole_id = row[1]
@@ -64,21 +55,24 @@ def create_files(lfb_list, directory_name_base, part_content_dict):
         # remove special characters from publication names and add suffix .xml
         file_name = create_file_name(name)
         new_file_path = directory_name_base + part_nr + "/" + file_name
+        new_file_paths.append(new_file_path)
         working_folder_path = XML_OUTPUT_FOLDER + new_file_path
-        # get the right div from the right source file
-        div_content = get_xml_content(part_nr, div_id, part_content_dict)
-        # create file content using template xml, div_content and title from list
-        with open(working_folder_path, "w", encoding="utf-8") as output_file:
-            template_soup = content_template()
-            # find the element where content is to be inserted
-            template_div = template_soup.find(type="collection")
-            # insert content
-            template_div.append(div_content)
-            # insert publication name as title
-            template_title = template_soup.find("title")
-            template_title.append(name)
-            # write to file as string
-            output_file.write(str(template_soup))
+        output_rows = part_rows.setdefault(part_nr, {})
+        if working_folder_path in output_rows:
+            print("Several rows have the file name " + working_folder_path + ", the last one is used: " + output_rows[working_folder_path][2] + " (" + part_nr + output_rows[working_folder_path][0] + ") is replaced by " + name + " (" + whole_id + ")")
+        output_rows[working_folder_path] = (div_id, working_folder_path, name)
+    part_nrs = sorted(part_rows)
+    tasks = [(large_file_list[int(part_nr) - 1], list(part_rows[part_nr].values())) for part_nr in part_nrs]
+    # output file paths of the files that were created
+    created_paths = set()
+    for (path, task_rows), part_nr, missing_div_ids in zip(tasks, part_nrs, map_collections(split_part, tasks, workers)):
+        if missing_div_ids:
+            print("Divs not found in part " + part_nr + ": " + ", ".join(missing_div_ids))
+        created_paths.update(working_folder_path for div_id, working_folder_path, name in task_rows if div_id not in missing_div_ids)
+    # a row gets a file path only if its file was created; rows sharing a file name with a row whose div wasn't found get none
+    for row, new_file_path in zip(lfb_list, new_file_paths):
+        if XML_OUTPUT_FOLDER + new_file_path not in created_paths:
+            continue
         # update list with the newly created file path
         row = add_db_file_path_to_list(row, new_file_path)
     return lfb_list
@@ -94,7 +88,7 @@ def content_template():
     <teiHeader>
     <fileDesc>
       <titleStmt>
-        <title></title>
+        <title>{title}</title>
         <respStmt>
           <resp/>
           <name/>
@@ -112,12 +106,12 @@ def content_template():
     <body xml:space="preserve">
     <div type="collection">
 
-    </div>
+    {content}</div>
     </body>
     </text>
     </TEI>
     '''
-    return BeautifulSoup(xml_template, "xml")
+    return compile_template(xml_template)
 
 def create_file_name(name):
     # remove special characters from publication names
@@ -134,31 +128,28 @@ def create_file_name(name):
     name = name + ".xml"
     return name
 
- # finds and returns the right div from the right source file
-def get_xml_content(part_nr, div_id, part_content_dict):
-    source_file_content = part_content_dict[int(part_nr)]
-    soup = BeautifulSoup(source_file_content, "xml")
-    div_content = soup.find(id=div_id)
-    return div_content
-
 # save parts of the updated list for later use
 # only legacy id and file path are needed
 # the file is needed for update_publication_with_filepaths.py
+# rows whose div wasn't found have no file path and are left out
 def write_list_to_csv(lfb_list, filename):
     with open(filename, "w", encoding="utf-8") as output_file:
         for row in lfb_list:
+            if len(row) < 5:
+                continue
             csv_row = row[3] + ";" + row[4] + "\n"
             output_file.write(csv_row)
 
 def main():
+    workers = get_worker_count(__doc__)
     # the starting point is a list of all the publications for which files need to be created
-    lfb_list = create_list_from_csv("csv/Lfb_split.csv")
+    lfb_list = get_csv_list("csv/Lfb_split.csv")
     # the files are created in folders whose name consist of this string and the part nr
     directory_name_base = "Lasning_for_barn_"
     create_directories(directory_name_base)
-    large_file_list = create_file_list("Lasning_for_barn") # give path to folder with source files to be split
-    part_content_dict = read_file_content_to_dict(large_file_list)
-    lfb_list = create_files(lfb_list, directory_name_base, part_content_dict)
+    large_file_list = create_file_list("Lasning_for_barn", ".xml") # give path to folder with source files to be split
+    lfb_list = create_files(lfb_list, directory_name_base, large_file_list, workers)
     write_list_to_csv(lfb_list, "csv/Lfb_signum_filer.csv")
 
-main()
\ No newline at end of file
+if __name__ == "__main__":
+    main()
\ No newline at end of file
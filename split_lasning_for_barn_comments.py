@@ -6,12 +6,18 @@ Comment info is then inserted into the database and connected to the right publi
 Created by Anna Movall and Jonas Lillqvist in March/April 2020.
 """
 
+import copy
 import os
 from pathlib import Path
 import re
 import psycopg2
 from bs4 import BeautifulSoup
 
+from bulk_load import insert_and_link
+from csv_registry import get_csv_list
+from catalogue import load_catalogue
+from tei_emitter import compile_template, FileWriterPool
+
 conn_new_db = psycopg2.connect(
     host="",
     database="",
@@ -25,16 +31,6 @@ XML_SOURCE_FILE = ""
 DIRECTORY_NAME_BASE = "Lasning_for_barn_"
 CSV_LIST = "csv/Lfb_split.csv"
 
-# creates a list from csv file with publication name, div id, publication id and legacy id
-def create_list_from_csv(filename):
-    with open(filename, "r", encoding="utf-8") as source_file:
-        lfb_list = []
-        for line in source_file:
-            row = line.rstrip()
-            elements = row.split(";")
-            lfb_list.append(elements)
-        return lfb_list
-
 # creates a folder for each of the 8 parts
 def create_directories(DIRECTORY_NAME_BASE):
     for i in range(1,9):
@@ -47,22 +43,48 @@ def read_text_from_file(source_file_path):
         content = source_file.read()
     return content
 
-# save each main div, containing comments to one part, in a dictionary with the part nr as key
+# save an index of the comments in each main div, containing comments to one part, in a dictionary with the part nr as key
+# the index has the case-folded title in the head of each comment div as key and the div as value
 # the divs are saved as Beautiful Soup objects
 def create_part_dict(comment_xml):
     comment_soup = BeautifulSoup(comment_xml, "xml")
     part_content_dict = {}
+    duplicate_titles = []
     i = 1
     for element in comment_soup.body.children:
         if element.name == "div":
-            part_content_dict[i] = element
+            part_content_dict[i] = create_comment_index(element, i, duplicate_titles)
             i += 1
+    if duplicate_titles:
+        print("Comment titles found more than once, the first comment is used:")
+        for part_nr, title in duplicate_titles:
+            print(str(part_nr) + ": " + title)
     return part_content_dict
 
+# index the comment divs (divs inside other divs) of one part by the title in their head
+# if several comments have the same title, the first one is used and the title is added to duplicate_titles
+def create_comment_index(part_div, part_nr, duplicate_titles):
+    comment_index = {}
+    for comment in part_div.find_all("div"):
+        if comment.parent.name != "div" or comment.head is None:
+            continue
+        main_title = comment.head.get_text()
+        if main_title.casefold() in comment_index:
+            duplicate_titles.append((part_nr, main_title))
+        else:
+            comment_index[main_title.casefold()] = comment
+    return comment_index
+
 # create a file for each comment in the right folder, using the corresponding publication's name as basis for file name (transform it suitably)
 # create file content using template xml and insert content from the right div in dictionary
 # insert title from lfb_list
+# the template is compiled once, and the files are written by a pool of threads
+# returns the rows for which a comment was found, with their file paths
 def create_files(lfb_list, DIRECTORY_NAME_BASE, part_content_dict):
+    template = content_template()
+    writer_pool = FileWriterPool()
+    created_rows = []
+    missing_rows = []
     # one file is created for each item in the list
     for row in lfb_list:
         name = row[0]
@@ -73,32 +95,28 @@ def create_files(lfb_list, DIRECTORY_NAME_BASE, part_content_dict):
         new_file_path = DIRECTORY_NAME_BASE + part_nr + "_komm" + "/" + file_name
         # get the right div as a soup object from the right source file
         div_content = get_xml_content(part_nr, name, part_content_dict)
+        if div_content is None:
+            missing_rows.append(row)
+            continue
         # remove head element from div_content 
         div_content.head.decompose()
         # extract bibliography for later use
         bibliography = div_content.find(rend="Litteratur")
         if bibliography is not None:
             bibliography.extract()
-        # create file content using template xml, div_content and title from list
-        with open(new_file_path, "w", encoding="utf-8") as output_file:
-            template_soup = content_template()
-            # find the element where content is to be inserted
-            template_comment_div = template_soup.find(type="comment")
-            # insert comment div contents without its own div
-            template_comment_div.append(div_content)
-            template_comment_div.div.unwrap()
-            # insert publication name as title
-            template_title = template_soup.find("title")
-            template_title.append(name)
-            # insert bibliography
-            if bibliography is not None:
-                template_bibl_div = template_soup.find(type="bibl")
-                template_bibl_div.append(bibliography)
-            # write to file as string
-            output_file.write(str(template_soup))
+        # insert comment div contents without its own div
+        comment_content = "".join(str(element) for element in div_content.contents)
+        # create file content using template xml, div_content, bibliography and title from list
+        writer_pool.write(new_file_path, template.render(title=name, content=comment_content, bibliography=bibliography))
         # update list with the newly created file path
         row = add_db_file_path_to_list(row, new_file_path)
-    return lfb_list
+        created_rows.append(row)
+    writer_pool.close()
+    if missing_rows:
+        print("No comment found for these publications:")
+        for row in missing_rows:
+            print(row[1] + ": " + row[0])
+    return created_rows
 
 # adds xml file path to one row in list of comment data
 # it will later be inserted in the db
@@ -113,7 +131,7 @@ def content_template():
     <teiHeader>
     <fileDesc>
       <titleStmt>
-        <title></title>
+        <title>{title}</title>
         <respStmt>
           <resp/>
           <name/>
@@ -132,16 +150,16 @@ def content_template():
     <div type="comment">
     <lb/>
 
-    </div>
+    {content}</div>
     <div type="notes">
     </div>
     <div type="bibl">
-    </div>
+    {bibliography}</div>
     </body>
     </text>
     </TEI>
     '''
-    return BeautifulSoup(xml_template, "xml")
+    return compile_template(xml_template)
 
 # creates comment file name using publication name as starting point
 def create_file_name(name):
@@ -159,19 +177,16 @@ def create_file_name(name):
     name = name + "_komm.xml"
     return name
 
- # finds and returns the right comment div from dictionary
+ # finds and returns the right comment div from dictionary, or None if there is none
  # the head element in the comment div contains the commented publication's name
  # it should match the name of the publication from the list
+ # a copy is returned, since the head and bibliography are removed from it
 def get_xml_content(part_nr, name, part_content_dict):
-    part_div = part_content_dict[int(part_nr)]
-    comments = part_div.select("div > div")
-    comment_div = None
-    for comment in comments:
-        main_title = comment.head.get_text()
-        if main_title.lower() == name.lower():
-            comment_div = comment
-            break
-    return comment_div
+    comment_index = part_content_dict[int(part_nr)]
+    comment_div = comment_index.get(name.casefold())
+    if comment_div is None:
+        return None
+    return copy.copy(comment_div)
 
 # writes parts of the updated list to file for later use
 # only legacy id and file path are needed
@@ -181,37 +196,31 @@ def write_list_to_csv(lfb_list, filename):
             csv_row = row[3] + ";" + row[4] + "\n"
             output_file.write(csv_row)
 
-# in order to update the db we need the new publication id
-def get_id_from_publication(legacy_id):
-    fetch_query = """SELECT id FROM publication WHERE legacy_id = %s"""
-    cursor_new.execute(fetch_query, (legacy_id,))
-    publication_id = cursor_new.fetchone()
-    return publication_id
+# in order to update the db we need the new publication id; returns None if the legacy id isn't found
+def get_id_from_publication(legacy_id, catalogue):
+    publication = catalogue.get_publication_by_legacy_id(legacy_id)
+    if publication is None:
+        return None
+    return publication.id
 
 # insert comment data into table publication_comment
-# then update table publication with the comment id
-def create_comment_data(lfb_list):
+# then update table publication with the comment id; both are done for all rows in one statement
+def create_comment_data(lfb_list, catalogue):
+    comment_rows = []
     for row in lfb_list:
         legacy_id = row[3]
         filepath = row[4]
         published = 1 # published internally
-        publication_id = get_id_from_publication(legacy_id)
-        insert_query = """INSERT INTO publication_comment(published, legacy_id, original_filename) VALUES (%s, %s, %s) RETURNING id"""
-        values_to_insert = (published, legacy_id, filepath)
-        cursor_new.execute(insert_query, values_to_insert)
-        # get newly created comment id
-        comment_id = cursor_new.fetchone()[0]
-        # update table publication with the comment id for this publication
-        update_query = """UPDATE publication SET publication_comment_id = %s WHERE id = %s"""
-        values_to_insert = (comment_id, publication_id)
-        cursor_new.execute(update_query, values_to_insert)
+        publication_id = get_id_from_publication(legacy_id, catalogue)
+        comment_rows.append((publication_id, (published, legacy_id, filepath)))
+    insert_and_link(cursor_new, "publication_comment", ("published", "legacy_id", "original_filename"), "publication", "publication_comment_id", comment_rows)
     conn_new_db.commit()
     conn_new_db.close()
     cursor_new.close()
 
 def main():
     # the starting point is a list of all the publications for which comment files need to be created
-    lfb_list = create_list_from_csv(CSV_LIST)
+    lfb_list = get_csv_list(CSV_LIST)
     # the files are created in folders whose name consist of this string and the part nr
     create_directories(DIRECTORY_NAME_BASE)
     source_file_path = Path(XML_SOURCE_FILE)
@@ -219,6 +228,8 @@ def main():
     part_content_dict = create_part_dict(comment_xml)
     lfb_list = create_files(lfb_list, DIRECTORY_NAME_BASE, part_content_dict)
     write_list_to_csv(lfb_list, "csv/Lfb_kommentarer_filer.csv")
-    create_comment_data(lfb_list)
+    # publications of all projects, for looking up publication id:s using legacy id:s
+    catalogue = load_catalogue(cursor_new, tables=())
+    create_comment_data(lfb_list, catalogue)
 
 main()
\ No newline at end of file
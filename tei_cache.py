@@ -0,0 +1,135 @@
+"""Persistent cache for metadata extracted from TEI XML files, such as the original files in the SVN checkout.
+The title, canonical body (see canonical_xml.py) and MinHash signature of the body (see fingerprint_index.py) of each
+file are extracted once and stored in an SQLite database (tei_cache.sqlite) together with the file's size and
+modification time. When a file is requested again, the cached values are used if
+the size and modification time are unchanged; otherwise the file is parsed again. Within a run, the values are also kept in memory, so each file is only looked up once.
+When only the title in the teiHeader is needed, get_header_title reads and parses the file only up to that title and caches it separately."""
+
+import atexit
+import os
+import sqlite3
+from array import array
+from collections import namedtuple
+from io import BytesIO
+from lxml import etree
+
+from canonical_xml import canonicalize_body
+from canonical_xml import get_body_digest
+from fingerprint_index import get_text_signature
+
+TEI_CACHE_FILE = "tei_cache.sqlite"
+# change this when the extracted values change; the cache is then emptied
+SCHEMA_VERSION = 6
+
+TeiMetadata = namedtuple("TeiMetadata", ["title", "body", "body_digest", "signature"])
+
+# process id as key, connection as value; a connection can't be shared by the forked worker processes
+connections = {}
+# table name and absolute file path as key, cached values as value
+metadata_cache = {}
+# new and changed rows are written to the database in batches, so that a run doesn't commit once for every file
+# and worker processes only hold the write lock for a short time
+# table name as key, (columns, list of rows) as value
+pending_rows = {}
+BATCH_SIZE = 500
+
+# open the cache database for this process and create the tables if needed
+def get_connection():
+    process_id = os.getpid()
+    if process_id not in connections:
+        connection = sqlite3.connect(TEI_CACHE_FILE, timeout=60)
+        # write-ahead logging lets several worker processes read while one of them writes
+        connection.execute("PRAGMA journal_mode=WAL")
+        schema_version = connection.execute("PRAGMA user_version").fetchone()[0]
+        if schema_version != SCHEMA_VERSION:
+            connection.execute("DROP TABLE IF EXISTS tei_file")
+            connection.execute("DROP TABLE IF EXISTS tei_header")
+            connection.execute("PRAGMA user_version = " + str(SCHEMA_VERSION))
+        connection.execute("""CREATE TABLE IF NOT EXISTS tei_file (path TEXT PRIMARY KEY, size INTEGER, mtime INTEGER, title TEXT, body TEXT, body_digest TEXT, signature BLOB)""")
+        connection.execute("""CREATE TABLE IF NOT EXISTS tei_header (path TEXT PRIMARY KEY, size INTEGER, mtime INTEGER, title TEXT)""")
+        connection.commit()
+        connections[process_id] = connection
+    return connections[process_id]
+
+# parse an xml file and extract the text content of the title element in its teiHeader,
+# the canonical form of its body element and the digest of the canonical body
+# the file is read once and both parses use its content
+def extract_metadata(filepath):
+    with open(filepath, "rb") as source_file:
+        content = source_file.read()
+    title = extract_header_title(BytesIO(content))
+    body = canonicalize_body(BytesIO(content))
+    return TeiMetadata(title, body, get_body_digest(body), encode_signature(get_text_signature(body)))
+
+# the MinHash signature of the body (see fingerprint_index.py) is stored as 64-bit integers; None if the body has no words
+def encode_signature(signature):
+    if signature is None:
+        return None
+    return array("Q", signature).tobytes()
+
+def decode_signature(value):
+    if value is None:
+        return None
+    signature = array("Q")
+    signature.frombytes(value)
+    return tuple(signature)
+
+# parse an xml file (a file path or a file object) only up to the title element in its teiHeader and return the title's text content
+# returns None if the teiHeader has no title; the file is read in chunks as it is parsed, so the rest of it is never read
+def extract_header_title(source):
+    in_header = False
+    for event, element in etree.iterparse(source, events=("start", "end"), recover=True):
+        if not isinstance(element.tag, str):
+            continue
+        tag = etree.QName(element).localname
+        if tag == "teiHeader":
+            if event == "end":
+                return None
+            in_header = True
+        elif in_header and tag == "title" and event == "end":
+            return "".join(element.itertext())
+    return None
+
+# returns the cached values of an xml file from table, or the values returned by extract_values for the file path if the file has changed
+def get_cached_values(table, columns, filepath, extract_values):
+    path = os.path.abspath(filepath)
+    if (table, path) in metadata_cache:
+        return metadata_cache[(table, path)]
+    connection = get_connection()
+    file_stat = os.stat(path)
+    size = file_stat.st_size
+    mtime = file_stat.st_mtime_ns
+    cached_row = connection.execute("SELECT size, mtime, " + ", ".join(columns) + " FROM " + table + " WHERE path = ?", (path,)).fetchone()
+    if cached_row is not None and cached_row[0] == size and cached_row[1] == mtime:
+        values = tuple(cached_row[2:])
+    else:
+        values = tuple(extract_values(path))
+        table_rows = pending_rows.setdefault(table, (columns, []))[1]
+        table_rows.append((path, size, mtime) + values)
+        if len(table_rows) >= BATCH_SIZE:
+            commit_cache()
+    metadata_cache[(table, path)] = values
+    return values
+
+# write the pending rows to the cache database in one transaction
+# called by the scripts when a collection has been read (also in worker processes), and when the process exits
+def commit_cache():
+    if len(pending_rows) == 0:
+        return
+    connection = get_connection()
+    with connection:
+        for table, (columns, rows) in pending_rows.items():
+            placeholders = ", ".join(["?"] * (len(columns) + 3))
+            connection.executemany("INSERT OR REPLACE INTO " + table + " (path, size, mtime, " + ", ".join(columns) + ") VALUES (" + placeholders + ")", rows)
+    pending_rows.clear()
+
+atexit.register(commit_cache)
+
+# returns the title, body, body digest and MinHash signature of an xml file, from the cache if the file hasn't changed
+def get_tei_metadata(filepath):
+    title, body, body_digest, signature = get_cached_values("tei_file", TeiMetadata._fields, filepath, extract_metadata)
+    return TeiMetadata(title, body, body_digest, decode_signature(signature))
+
+# returns the text content of the title element in the teiHeader of an xml file, from the cache if the file hasn't changed
+def get_header_title(filepath):
+    return get_cached_values("tei_header", ("title",), filepath, lambda path: (extract_header_title(path),))[0]
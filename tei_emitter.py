@@ -0,0 +1,70 @@
+"""Writes the xml files created by the split scripts from a template.
+A template is compiled once into fixed segments of bytes with slots between them, e.g. for the title, the content div
+and the bibliography. A file is created by joining the segments with the values of the slots, so the template doesn't
+have to be parsed and serialized again for each file. The files are written by a pool of threads, so the next file can
+be prepared while the earlier ones are being written."""
+
+from concurrent.futures import ThreadPoolExecutor
+import re
+from xml.sax.saxutils import escape
+
+XML_DECLARATION = '<?xml version="1.0" encoding="utf-8"?>\n'
+# a slot is marked in the template by its name in curly brackets, e.g. {title}
+SLOT_PATTERN = re.compile(r"\{(\w+)\}")
+# slots whose value is text and needs to be escaped; the other slots get serialized xml
+TEXT_SLOTS = ("title",)
+WRITER_THREADS = 4
+
+class TeiTemplate:
+    def __init__(self, xml_template):
+        parts = SLOT_PATTERN.split(XML_DECLARATION + xml_template.strip() + "\n")
+        # fixed segments as bytes; there is a slot between each two segments
+        self.segments = [part.encode("utf-8") for part in parts[0::2]]
+        self.slots = parts[1::2]
+
+    # returns the content of a file as bytes; the values are given as keyword arguments with the slot names
+    # a value can be a string or an element (it is then serialized with str); missing values and None leave the slot empty
+    def render(self, **values):
+        content = [self.segments[0]]
+        for slot, segment in zip(self.slots, self.segments[1:]):
+            value = values.get(slot)
+            if value is None:
+                value = ""
+            elif slot in TEXT_SLOTS:
+                value = escape(str(value))
+            else:
+                value = str(value)
+            content.append(value.encode("utf-8"))
+            content.append(segment)
+        return b"".join(content)
+
+# compile the template once and use it for all files
+def compile_template(xml_template):
+    return TeiTemplate(xml_template)
+
+# previous_write is the write of an earlier content to the same file, or None; it is waited for, so the last content given is the one kept
+def write_bytes_to_file(filename, content, previous_write=None):
+    if previous_write is not None:
+        previous_write.result()
+    with open(filename, "wb") as output_file:
+        output_file.write(content)
+
+class FileWriterPool:
+    def __init__(self, workers=WRITER_THREADS):
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+        self.futures = []
+        # file name as key, the latest write to the file as value
+        self.latest_writes = {}
+
+    # the file is written by one of the threads; the content has to be complete when it is given
+    # writes to the same file are done in the order they are given, so the file gets the last content
+    def write(self, filename, content):
+        future = self.executor.submit(write_bytes_to_file, filename, content, self.latest_writes.get(filename))
+        self.latest_writes[filename] = future
+        self.futures.append(future)
+
+    # wait until all files have been written; an error in any of the threads is raised here
+    def close(self):
+        self.executor.shutdown(wait=True)
+        for future in self.futures:
+            future.result()
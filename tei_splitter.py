@@ -0,0 +1,34 @@
+"""Streaming splitter for large TEI files containing many works, such as the 8 parts of Läsning för barn.
+The file is parsed incrementally, and each wanted element is serialized as soon as its end tag has been read.
+Elements that have been read are then cleared, so only the element being read is kept in memory, not the whole file."""
+
+from lxml import etree
+
+# parse an xml file (a file path or a file object) incrementally and yield (id, xml string) for each element whose id
+# is in wanted_ids, in the order their end tags appear; if several elements have the same id, the first one is used
+# an element is cleared after it has ended, unless it is inside a wanted element that hasn't ended yet
+# parsing stops when all wanted elements have been read
+def iter_elements_by_id(source, wanted_ids):
+    wanted_ids = set(wanted_ids)
+    found_ids = set()
+    # wanted elements whose end tag hasn't been read yet, the innermost last
+    open_elements = []
+    for event, element in etree.iterparse(source, events=("start", "end"), recover=True):
+        if event == "start":
+            element_id = element.get("id")
+            if element_id in wanted_ids and element_id not in found_ids:
+                found_ids.add(element_id)
+                open_elements.append(element)
+            continue
+        if open_elements and open_elements[-1] is element:
+            open_elements.pop()
+            yield element.get("id"), etree.tostring(element, encoding="unicode", with_tail=False)
+        if not open_elements:
+            if len(found_ids) == len(wanted_ids):
+                return
+            # free the element and the elements before it
+            element.clear()
+            parent = element.getparent()
+            if parent is not None:
+                while element.getprevious() is not None:
+                    del parent[0]
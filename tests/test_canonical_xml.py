@@ -0,0 +1,28 @@
+from io import BytesIO
+
+import pytest
+
+pytest.importorskip("lxml")
+
+from canonical_xml import canonicalize_body, get_body_digest
+
+WEB_XML = b"""<?xml version="1.0" encoding="utf-8"?>
+<TEI xmlns="http://www.tei-c.org/ns/1.0"><teiHeader/><text><body>
+<lg xml:id="lg1"><l n="1"  rend="indent" type="a">Hej &amp; du</l></lg>
+<p xml:id="p1">text</p>
+</body></text></TEI>"""
+
+ORIGINAL_XML = b"""<TEI xmlns="http://www.tei-c.org/ns/1.0"><text><body>
+<lg><l type='a' rend='indent'>Hej &amp; du</l></lg>
+<p>text</p>
+</body></text></TEI>"""
+
+def test_body_is_c14n_without_added_attributes():
+    expected = '<body xmlns="http://www.tei-c.org/ns/1.0"> <lg><l rend="indent" type="a">Hej &amp; du</l></lg> <p>text</p> </body>'
+    assert canonicalize_body(BytesIO(WEB_XML)) == expected
+
+def test_web_and_original_file_have_same_digest():
+    assert get_body_digest(canonicalize_body(BytesIO(WEB_XML))) == get_body_digest(canonicalize_body(BytesIO(ORIGINAL_XML)))
+
+def test_file_without_body():
+    assert canonicalize_body(BytesIO(b"<TEI><teiHeader/></TEI>")) == ""
@@ -0,0 +1,30 @@
+import random
+from pathlib import Path
+
+import pytest
+
+pytest.importorskip("rapidfuzz")
+# cpdist returns a numpy array
+pytest.importorskip("numpy")
+from rapidfuzz import fuzz
+
+from filename_index import create_filename_index, get_best_positions, match_pubnames_with_filenames
+
+def test_candidates_give_same_matches_as_comparing_all_files():
+    random_generator = random.Random(3)
+    words = ["sagan", "om", "hans", "stjarn", "ogat", "vinter", "natt", "a", "b_c", "bjorken"]
+    filepath_list = [Path("komm/" + "_".join(random_generator.choice(words) for i in range(random_generator.randint(1, 3))) + ".xml") for j in range(200)]
+    filename_index = create_filename_index(filepath_list)
+    for j in range(200):
+        search_str = "_".join(random_generator.choice(words) for i in range(random_generator.randint(1, 3)))
+        expected = [position for position, stem in enumerate(filename_index.stems) if fuzz.partial_ratio(search_str, stem) == 100]
+        assert filename_index.find_all(search_str) == expected
+        assert get_best_positions([search_str], filename_index, 1) == [expected]
+
+def test_closest_length_wins_and_ties_are_reported():
+    filepath_list = [Path("komm/Sagan om Hans och Greta.xml"), Path("komm/Hans.xml"), Path("komm/Vinter.xml")]
+    filename_index = create_filename_index(filepath_list)
+    matches, ties, ambiguous_files = match_pubnames_with_filenames(["Hans", "Sagan om Hans och", "Natt"], filename_index)
+    assert matches == [filepath_list[1], filepath_list[0], None]
+    assert ties == [("Hans", [filepath_list[1], filepath_list[0]]), ("Sagan om Hans och", [filepath_list[0], filepath_list[1]])]
+    assert ambiguous_files == []
@@ -0,0 +1,43 @@
+import pytest
+
+from id_map import create_id_map, export_id_map_to_json, read_id_map, write_id_map
+
+def test_round_trip_through_file(tmp_path):
+    filename = str(tmp_path / "publication_ids.idmap")
+    # the old id dictionaries had id:s as strings
+    write_id_map({3: 101, "7": 102, 12: 250}, filename, "publication")
+    id_map = read_id_map(filename)
+    assert id_map.get(3) == 101
+    assert id_map["7"] == 102
+    assert id_map.get(4) is None
+    assert id_map.get(1000) is None
+    assert 12 in id_map
+    assert id_map.old_id(250) == 12
+    assert id_map.old_id(103, "missing") == "missing"
+    assert list(id_map.items()) == [(3, 101), (7, 102), (12, 250)]
+    assert len(id_map) == 3
+    id_map.close()
+
+def test_export_to_json(tmp_path):
+    filename = str(tmp_path / "collection_ids.idmap")
+    json_filename = tmp_path / "collection_ids.json"
+    write_id_map({2: 20, 1: 10}, filename, "publication_collection")
+    export_id_map_to_json(filename, str(json_filename))
+    assert json_filename.read_text(encoding="utf-8") == '{"1": 10, "2": 20}'
+
+@pytest.mark.parametrize("old_id", [0, -5, "abc", None, 10 ** 12])
+def test_invalid_old_id_names_id_and_table(old_id):
+    with pytest.raises(ValueError) as error:
+        create_id_map({1: 1, old_id: 2}, "publication_version")
+    assert "publication_version" in str(error.value)
+    assert repr(old_id) in str(error.value)
+
+def test_invalid_new_id():
+    with pytest.raises(ValueError, match="publication: new id 0"):
+        create_id_map({1: 0}, "publication")
+
+def test_file_that_is_not_an_id_map(tmp_path):
+    filename = tmp_path / "other.idmap"
+    filename.write_bytes(b"x" * 32)
+    with pytest.raises(ValueError):
+        read_id_map(str(filename))
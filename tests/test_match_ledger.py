@@ -0,0 +1,27 @@
+from match_ledger import MatchLedger, read_ledger
+
+def test_duplicates_and_summary(tmp_path):
+    filename = str(tmp_path / "versions.jsonl")
+    ledger = MatchLedger(filename)
+    ledger.record("version", "matched", version_id=1, path="a.xml")
+    ledger.record("version", "unmatched", version_id=2)
+    ledger.record("version", "matched", version_id=3, path="b.xml")
+    ledger.record("version", "matched", version_id=4, path="a.xml")
+    ledger.record("version", "matched", version_id=5, path="a.xml")
+    ledger.record("directory", "found", version_id=1, path="a.xml")
+    ledger.close()
+    duplicates = ledger.get_duplicates()
+    # a path matched three times is listed once, with all its entries
+    assert [path for path, entries in duplicates] == ["a.xml"]
+    assert [entry["version_id"] for entry in duplicates[0][1]] == [1, 4, 5]
+    # only the entries of the given stage are counted
+    assert ledger.get_match_summary("version", "Versions") == "Versions matched: 4/5. Percentage matched: 80.0"
+    assert len(read_ledger(filename)) == 6
+
+def test_no_duplicates(tmp_path):
+    ledger = MatchLedger(str(tmp_path / "comments.jsonl"))
+    ledger.record("comment", "matched", publication_id=1, path="a.xml")
+    ledger.record("comment", "unmatched", publication_id=2)
+    ledger.close()
+    assert ledger.get_duplicates() == []
+    assert ledger.get_match_summary("comment", "Publications") == "Publications matched: 1/2. Percentage matched: 50.0"
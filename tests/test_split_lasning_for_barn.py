@@ -0,0 +1,39 @@
+import pytest
+
+pytest.importorskip("lxml")
+
+import split_lasning_for_barn
+
+LARGE_FILE = """<TEI xmlns="http://www.tei-c.org/ns/1.0"><text><body>
+<div id="d1"><p>first</p></div>
+<div id="d2"><p>second</p></div>
+</body></text></TEI>"""
+
+def test_duplicate_name_uses_last_row(tmp_path, monkeypatch, capsys):
+    monkeypatch.chdir(tmp_path)
+    large_file = tmp_path / "part1.xml"
+    large_file.write_text(LARGE_FILE, encoding="utf-8")
+    directory_name_base = "Lasning_for_barn_"
+    split_lasning_for_barn.create_directories(directory_name_base)
+    # two rows in part 1 with the same name give the same file name; the second row comes first in the file
+    lfb_list = [["Sagan", "1d2", "", "32_1"], ["Sagan", "1d1", "", "32_2"]]
+    lfb_list = split_lasning_for_barn.create_files(lfb_list, directory_name_base, [large_file], 1)
+    content = (tmp_path / "Lfb_split_files" / "Lasning_for_barn_1" / "sagan.xml").read_text(encoding="utf-8")
+    assert "first" in content
+    assert "second" not in content
+    assert "Several rows have the file name" in capsys.readouterr().out
+    assert lfb_list[0][4] == lfb_list[1][4] == "documents/trunk/Lasning_for_barn/Lasning_for_barn_1/sagan.xml"
+
+def test_rows_sharing_name_with_missing_div_get_no_path(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    large_file = tmp_path / "part1.xml"
+    large_file.write_text(LARGE_FILE, encoding="utf-8")
+    directory_name_base = "Lasning_for_barn_"
+    split_lasning_for_barn.create_directories(directory_name_base)
+    # the last row with the name refers to a div that doesn't exist, so no file is created for the name
+    lfb_list = [["Sagan", "1d1", "", "32_1"], ["Sagan", "1d9", "", "32_2"], ["Natt", "1d2", "", "32_3"]]
+    lfb_list = split_lasning_for_barn.create_files(lfb_list, directory_name_base, [large_file], 1)
+    assert not (tmp_path / "Lfb_split_files" / "Lasning_for_barn_1" / "sagan.xml").exists()
+    assert [len(row) for row in lfb_list] == [4, 4, 5]
+    split_lasning_for_barn.write_list_to_csv(lfb_list, "Lfb_signum_filer.csv")
+    assert (tmp_path / "Lfb_signum_filer.csv").read_text(encoding="utf-8") == "32_3;documents/trunk/Lasning_for_barn/Lasning_for_barn_1/natt.xml\n"
@@ -0,0 +1,15 @@
+from tei_emitter import compile_template, FileWriterPool
+
+def test_render_escapes_title_and_inserts_content():
+    template = compile_template("<TEI><title>{title}</title><div>{content}</div><div>{bibliography}</div></TEI>")
+    content = template.render(title="Hans & Greta", content="<p>text</p>")
+    assert content == b'<?xml version="1.0" encoding="utf-8"?>\n<TEI><title>Hans &amp; Greta</title><div><p>text</p></div><div></div></TEI>\n'
+
+def test_writes_to_same_file_keep_last_content(tmp_path):
+    filename = str(tmp_path / "story.xml")
+    writer_pool = FileWriterPool(workers=4)
+    for i in range(50):
+        writer_pool.write(filename, (str(i) * 100000).encode("utf-8"))
+    writer_pool.close()
+    with open(filename, "rb") as written_file:
+        assert written_file.read() == ("49" * 100000).encode("utf-8")
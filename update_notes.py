@@ -5,9 +5,11 @@ the document id:s for them needed to be changed in the database containing lemma
 Created by Anna Movall and Jonas Lillqvist in May 2020.
 """
 
+import mmap
+import re
 import mysql.connector
-from pathlib import Path
-from bs4 import BeautifulSoup
+
+from file_inventory import create_file_list
 
 conn_old_db = mysql.connector.connect(
     host="",
@@ -21,6 +23,9 @@ cursor_old = conn_old_db.cursor()
 
 OLD_DOCUMENT_ID = (4395, 4396, 4397, 4398, 4399, 4400, 4401, 4402)
 XML_SOURCE_FOLDER = "Lfb_split_files"
+# the anchor starting a lemma has the xml:id start + lemma id; there may be whitespace around =
+# comments and CDATA sections are matched too, so that anchors inside them can be skipped
+ANCHOR_PATTERN = re.compile(rb"""<!--.*?-->|<!\[CDATA\[.*?\]\]>|xml:id\s*=\s*(["'])start(\d+)\1""", re.DOTALL)
 
 # from table documentnote, fetch the id for each lemma belonging to the old Lfb-files
 def get_lemma_id():
@@ -30,31 +35,21 @@ def get_lemma_id():
     lemma_id = cursor_old.fetchall()
     return lemma_id
 
-# create path object for folder from given filepath string, save all paths to files found in this folder or subfolders in a list
-def create_file_list():
-    path = Path(XML_SOURCE_FOLDER)
-    filelist = []
-    iterate_through_folders(path, filelist)
-    return filelist
-
-# iterate through folders recursively and append filepaths to list
-def iterate_through_folders(path, filelist):
-    for content in path.iterdir():
-        if content.is_dir():
-            iterate_through_folders(content, filelist)
-        else:
-            filelist.append(content)
-
-# find out which file a lemma belongs to and return the file path for the file
-def find_lemma_in_file(lemma_id, xml_filepath_list):
-    xml_id_value = "start" + str(lemma_id)
+# find out which file each lemma belongs to by reading each file once
+# returns a dictionary with the lemma id as a string, as in the xml:id, as key and the file path as value
+# if the anchor of a lemma is found in several files, the first file is used
+def create_anchor_index(xml_filepath_list):
+    anchor_index = {}
     for filepath in xml_filepath_list:
-        with filepath.open(encoding="utf-8") as xml_file:
-            soup = BeautifulSoup(xml_file, "xml")
-            anchor = soup.find(attrs={"xml:id" : xml_id_value})
-            if anchor:
-                return(filepath)
-    return False
+        with filepath.open("rb") as xml_file:
+            # an empty file can't be memory-mapped and has no anchors
+            if filepath.stat().st_size == 0:
+                continue
+            with mmap.mmap(xml_file.fileno(), 0, access=mmap.ACCESS_READ) as content:
+                for match in ANCHOR_PATTERN.finditer(content):
+                    if match.group(2) is not None:
+                        anchor_index.setdefault(match.group(2).decode("ascii"), filepath)
+    return anchor_index
 
 # get document_id from db using file path
 def fetch_document_id(filepath):
@@ -75,9 +70,10 @@ def update_document_id(new_document_id, lemma_id):
 
 def main():
     lemma_ids = get_lemma_id()
-    xml_filepath_list = create_file_list()
+    xml_filepath_list = create_file_list(XML_SOURCE_FOLDER)
+    anchor_index = create_anchor_index(xml_filepath_list)
     for lemma_id in lemma_ids:
-        filepath = find_lemma_in_file(lemma_id[0], xml_filepath_list)
+        filepath = anchor_index.get(str(lemma_id[0]))
         if filepath:
             folder = filepath.parts[1]
             filename = filepath.parts[2]
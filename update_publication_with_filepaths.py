@@ -3,15 +3,22 @@ Created by Anna Movall and Jonas Lillqvist in February 2020"""
 
 import mysql.connector
 import psycopg2
-import json
 from pathlib import Path
 import re
 from fuzzywuzzy import fuzz
 
-from create_comment_data import create_file_list
-from create_comment_data import iterate_through_folders
-from create_comment_data import read_dict_from_file
-from create_comment_data import compare_pubnames_with_filenames
+from file_inventory import create_file_list
+from filename_index import create_filename_index
+from filename_index import match_pubnames_with_filenames
+from filename_index import write_ambiguous_matches_to_log
+from bulk_load import update_rows
+from catalogue import load_collection_catalogue
+from parallel import get_score_workers
+from parallel import get_worker_count
+from parallel import map_collections
+from match_ledger import MatchLedger
+from id_map import read_id_map
+from csv_registry import get_csv_dict
 
 conn_old_db = mysql.connector.connect(
     host="",
@@ -30,133 +37,137 @@ conn_new_db = psycopg2.connect(
 )
 cursor_new = conn_new_db.cursor()
 
-# get relevant info from publication table using select with collection id
-def get_publication_info(new_collection_id):
-    fetch_query = """SELECT id, name, legacy_id FROM publication WHERE publication_collection_id = %s"""
-    cursor_new.execute(fetch_query, (new_collection_id,))
-    publication_info = cursor_new.fetchall()
+# get relevant info about the publications in a collection from the catalogue
+def get_publication_info(catalogue, new_collection_id):
+    publication_info = [(publication.id, publication.name, publication.legacy_id) for publication in catalogue.get_publications(new_collection_id)]
     return publication_info
 
-# compare letters' identifiers with all of the collection's file names (containing the same identifiers) to find out each letter's original file path
-def compare_letters_with_filenames(publication_id, filepath_list, match_count, publication_count):
-    publication_id_dict = read_dict_from_file("id_dictionaries/publication_ids.json")
+# use new publication id to find out old id using id map
+# then use old id to fetch letter identifier from old database
+def get_letter_signum(publication_id, publication_id_map):
     fetch_query = """SELECT p_FM from publications WHERE p_id = %s"""
-    # use new publication id to find out old id using id dictionary
-    # then use old id to fetch letter identifier from old database
-    for key, value in publication_id_dict.items():
-        if value == publication_id:
-            old_publication_id = int(key)
-            cursor_old.execute(fetch_query, (old_publication_id,))
-            signum = cursor_old.fetchone()[0]
-            if signum is None or signum == "":
-                original_path = None
-                break
-            signum = signum.strip()
-            found = False
-            i = 0
-            # for filepath in filepath_list:
-            while found == False and i < len(filepath_list):
-                original_path = filepath_list[i]
-                # get filename without suffix
-                filepath = filepath_list[i].stem
-                # most letter filepaths contain an identifier in this form:
-                search_str = re.compile(r"Br\d{1,4}$")
-                # search for an identifier in the filepath
-                match_str = re.search(search_str, filepath)
-                # if the file path contains no identifier, skip to next file path in the list
-                if match_str is None:
-                    i += 1
-                    continue
-                # if the identifier is found, save the matched string in a variable
-                match_str = match_str.group(0)
-                # compare the matched string to identifier from old database
-                if match_str == signum:
-                    found = True
-                    match_count += 1
-                    break # exit loop if the two values match
-                i += 1
-            if not found:
-                original_path = None
-    publication_count += 1
-    return original_path, match_count, publication_count
+    old_publication_id = publication_id_map.old_id(publication_id)
+    if old_publication_id is None:
+        return None
+    cursor_old.execute(fetch_query, (old_publication_id,))
+    signum = cursor_old.fetchone()[0]
+    if signum is None or signum == "":
+        return None
+    return signum.strip()
+
+# compare letters' identifiers with all of the collection's file names (containing the same identifiers) to find out each letter's original file path
+# the identifiers are read from the file names once per collection; if several files have the same identifier, the first one is used
+# returns the matching file path (or None) for each identifier in signums
+def compare_letters_with_filenames(signums, filepath_list):
+    # most letter filepaths contain an identifier in this form:
+    search_str = re.compile(r"Br\d{1,4}$")
+    identifier_path_dict = {}
+    for path in filepath_list:
+        # search for an identifier in the filepath without suffix
+        match_str = re.search(search_str, path.stem)
+        if match_str is not None and match_str.group(0) not in identifier_path_dict:
+            identifier_path_dict[match_str.group(0)] = path
+    return [identifier_path_dict.get(signum) for signum in signums]
+
+# find the file paths for all publications in one collection
+# task is a tuple of old collection id, collection path, publication names, letter identifiers (only for Brev) and number of threads for the score matrix
+# returns the matching file path (or None) for each publication, ties and ambiguous files
+def match_collection(task):
+    old_id, collection_path, publication_names, signums, score_workers = task
+    if old_id < 30 and old_id != 23 and old_id != 20: # don't use this comparison function for Brev, Publicistik, Forelasningar
+        filepath_list = create_file_list(collection_path)
+        filename_index = create_filename_index(filepath_list)
+        return match_pubnames_with_filenames(publication_names, filename_index, score_workers)
+    if old_id == 30 or old_id == 31: # Brev have their own comparison function
+        filepath_list = create_file_list(collection_path)
+        return compare_letters_with_filenames(signums, filepath_list), [], []
+    # matching file paths for Publicistik, Forelasningar and Lasning for barn are kept in separate documents
+    return None, [], []
+
+# record the match in the ledger and save publication id and original_filename for the update of table publication
+# stage is "filename" for publications matched with the file names in the collection folder and "csv" for those found in a csv document
+def add_publication_update(ledger, stage, publication_name, original_filename, publication_id, filename_updates):
+    ledger.record(stage, "matched", publication_id=publication_id, publication_name=publication_name, path=original_filename)
+    filename_updates.append((publication_id, original_filename))
 
-# update table publication with original_filename for each publication, if the file name has been found
-def update_publication(log_found, publication_name, original_filename, publication_id):
-    log_found.write("PUBLICATION: " + publication_name + " MATCHED " + original_filename + "\n")
-    update_query = """UPDATE publication SET original_filename = %s WHERE id = %s"""
-    values_to_insert = (original_filename, publication_id)
-    cursor_new.execute(update_query, values_to_insert)
+# write the text logs from the ledger; only the publications matched with file names are included in the statistics
+def write_logs(ledger):
+    ledger.write_text_log("logs/matched_reading_texts.txt", lambda entry: "PUBLICATION: " + entry["publication_name"] + " MATCHED " + entry["path"] + "\n", status="matched", footer="\n" + ledger.get_match_summary("filename", "Publications"))
+    ledger.write_text_log("logs/unmatched_reading_texts.txt", lambda entry: "Publication name: " + entry["publication_name"] + "\n", status="unmatched")
 
-# reads csv and creates dictionary for update of table publication with original_filename, for collection Publicistik, Forelasningar and Lasning for barn
-def create_dict_from_csv(filename):
-    with open(filename, encoding="utf-8") as source_file:
-        rows = source_file.readlines()
-        info_dict = {}
-        for row in rows:
-            row = row.rstrip()
-            elements = row.split(";")
-            info_dict[elements[0]] = elements[1]
-        return(info_dict)
+# update table publication with original_filename for all publications whose file name has been found
+def update_publication(filename_updates):
+    update_rows(cursor_new, "publication", "original_filename", filename_updates)
 
 def main():
-    collection_id_dict = read_dict_from_file("id_dictionaries/collection_ids.json")
+    workers = get_worker_count(__doc__)
+    score_workers = get_score_workers(workers)
+    collection_id_map = read_id_map("id_dictionaries/collection_ids.idmap")
+    # used for finding the old id of letters
+    publication_id_map = read_id_map("id_dictionaries/publication_ids.idmap")
     old_collections = [(1, "../../Topelius SVN/documents/trunk/Ljungblommor"), (2, "../../Topelius SVN/documents/trunk/Nya_blad_och_Ljung"), (4, "../../Topelius SVN/documents/trunk/Noveller"), (5, "../../Topelius SVN/documents/trunk/Hertiginnan_af_Finland_och_andra_historiska_noveller"), (7, "../../Topelius SVN/documents/trunk/Vinterqvallar"), (12, "../../Topelius SVN/documents/trunk/Finland_framstalldt_i_teckningar"), (16, "../../Topelius SVN/documents/trunk/Ovrig_lyrik"), (18, "../../Topelius SVN/documents/trunk/Noveller_och_kortprosa"), (24, "../../Topelius SVN/documents/trunk/Academica"), (30, "../../Topelius SVN/documents/trunk/Brev/Forlagskorrespondens"), (6, "../../Topelius SVN/documents/trunk/Faltskarns_berattelser"), (8, "../../Topelius SVN/documents/trunk/Planeternas_skyddslingar"), (10, "../../Topelius SVN/documents/trunk/Naturens_bok_och_Boken_om_vart_land"), (13, "../../Topelius SVN/documents/trunk/En_resa_i_Finland"),  (17, "../../Topelius SVN/documents/trunk/Dramatik"), (19, "../../Topelius SVN/documents/trunk/Ovrig_barnlitteratur"), (20, "../../Topelius SVN/documents/trunk/Forelasningar"), (22, "../../Topelius SVN/documents/trunk/Finland_i_19de_seklet"), (23, "../../Topelius SVN/documents/trunk/Publicistik"), (26, "../../Topelius SVN/documents/trunk/Religiosa_skrifter_och_psalmer"), (29, "../../Topelius SVN/documents/trunk/Dagbocker"), (31, "../../Topelius SVN/documents/trunk/Brev/Foraldrakorrespondens"), (32, "../../Topelius SVN/documents/trunk/Lasning_for_barn")]
-    # initialize counters for match log statistics
-    publication_count = 0
-    match_count = 0
-    # create log files
-    log_found = open("logs/matched_reading_texts.txt", "w", encoding="utf-8")
-    log_not_found = open("logs/unmatched_reading_texts.txt", "w", encoding="utf-8")
-    # loop through collections and publications in them
+    # load the publications of all collections with one query per table
+    catalogue = load_collection_catalogue(cursor_new, [collection_id_map[collection[0]] for collection in old_collections], tables=())
+    ledger = MatchLedger("logs/reading_texts.jsonl")
+    log_ambiguous = open("logs/ambiguous_reading_texts.txt", "w", encoding="utf-8")
+    # publication id and original_filename for each match; table publication is updated with all of them at once
+    filename_updates = []
+    # select publications in all collections first, so that the matching of the collections can be done in parallel
+    collection_info = []
+    match_tasks = []
     for collection in old_collections:
         old_id = collection[0]
         collection_path = collection[1]
-        new_collection_id = collection_id_dict[str(old_id)] # get new collection id using dictionary
-        publication_info = get_publication_info(new_collection_id) # select publications with this collection id from table publication
-        filepath_list = create_file_list(collection_path)
-        for tuple in publication_info:
+        new_collection_id = collection_id_map[old_id] # get new collection id using id map
+        publication_info = get_publication_info(catalogue, new_collection_id) # get publications with this collection id
+        publication_names = [tuple[1] for tuple in publication_info]
+        signums = None
+        if old_id == 30 or old_id == 31: # Brev are matched using their identifiers from the old db
+            signums = [get_letter_signum(tuple[0], publication_id_map) for tuple in publication_info]
+        collection_info.append((old_id, publication_info))
+        match_tasks.append((old_id, collection_path, publication_names, signums, score_workers))
+    # the match results come in the same order as the tasks
+    match_results = map_collections(match_collection, match_tasks, workers)
+    # loop through collections and publications in them
+    for (old_id, publication_info), (matched_filepaths, ties, ambiguous_files) in zip(collection_info, match_results):
+        write_ambiguous_matches_to_log(log_ambiguous, ties, ambiguous_files)
+        for i, tuple in enumerate(publication_info):
             publication_name = tuple[1]
             publication_id = tuple[0]
             legacy_id = tuple[2]
-            if old_id < 30 and old_id != 23 and old_id != 20: # don't use this comparison function for Brev, Publicistik, Forelasningar
-                filepath, match_count, publication_count = compare_pubnames_with_filenames(publication_name, filepath_list, match_count, publication_count)
-                # if the publication has a matching file path, update table publication and write match to log file
-                if filepath is not None:
-                    original_filename = filepath.as_posix().replace("../../Topelius SVN/", "") # create file path string and shorten it
-                    update_publication(log_found, publication_name, original_filename, publication_id)
-                # if no matching file path was found, write this to log file
-                else:
-                    log_not_found.write("Publication name: " + publication_name + "\n")
-            elif old_id == 30 or old_id == 31: # Brev have their own comparison function; otherwise the same as above
-                filepath, match_count, publication_count = compare_letters_with_filenames(publication_id, filepath_list, match_count, publication_count)
+            if old_id < 30 and old_id != 23 and old_id != 20 or old_id == 30 or old_id == 31: # names and Brev are matched with file paths from the collection folder
+                filepath = matched_filepaths[i]
+                # if the publication has a matching file path, update table publication and record the match
                 if filepath is not None:
                     original_filename = filepath.as_posix().replace("../../Topelius SVN/", "") # create file path string and shorten it
-                    update_publication(log_found, publication_name, original_filename, publication_id)
+                    add_publication_update(ledger, "filename", publication_name, original_filename, publication_id, filename_updates)
+                # if no matching file path was found, record this too
                 else:
-                    log_not_found.write("Publication name: " + publication_name + "\n")   
+                    ledger.record("filename", "unmatched", publication_id=publication_id, publication_name=publication_name)
             elif old_id == 23: # matching file paths for Publicistik are kept in a separate document
-                publicistik_info_dict = create_dict_from_csv("csv/ZTS_Publicistik_verk_signum_filer.csv")
+                publicistik_info_dict = get_csv_dict("csv/ZTS_Publicistik_verk_signum_filer.csv")
                 # get file name from dictionary using legacy_id
                 if legacy_id in publicistik_info_dict.keys():
                     filename = publicistik_info_dict[legacy_id]
                     year = filename[0:4] # get year from file name and use it as folder name
                     original_filename = "documents/trunk/Publicistik/" + year + "/" + filename
-                    update_publication(log_found, publication_name, original_filename, publication_id)
+                    add_publication_update(ledger, "csv", publication_name, original_filename, publication_id, filename_updates)
                 else:
-                    log_not_found.write("Publication name: " + publication_name + "\n")
+                    ledger.record("csv", "unmatched", publication_id=publication_id, publication_name=publication_name)
             elif old_id == 20: # matching file paths for Forelasningar are kept in a separate document; they are all there; otherwise as above
-                forelasningar_info_dict = create_dict_from_csv("csv/Forelasningar_signum_filer.csv")
+                forelasningar_info_dict = get_csv_dict("csv/Forelasningar_signum_filer.csv")
                 filename = forelasningar_info_dict[legacy_id]
                 original_filename = "documents/trunk/Forelasningar/" + filename
-                update_publication(log_found, publication_name, original_filename, publication_id)
+                add_publication_update(ledger, "csv", publication_name, original_filename, publication_id, filename_updates)
             elif old_id == 32: # matching file paths for Lasning for barn are kept in a separate document
-                lfb_info_dict = create_dict_from_csv("csv/Lfb_signum_filer.csv")
+                lfb_info_dict = get_csv_dict("csv/Lfb_signum_filer.csv")
                 original_filename = lfb_info_dict[legacy_id]
-                update_publication(log_found, publication_name, original_filename, publication_id)         
+                add_publication_update(ledger, "csv", publication_name, original_filename, publication_id, filename_updates)
+    update_publication(filename_updates)
     conn_new_db.commit()
-    log_found.write("\nPublications matched: " + str(match_count) + "/" + str(publication_count) + ". Percentage matched: " + str(match_count/publication_count*100))
-    log_found.close()
-    log_not_found.close()
+    ledger.close()
+    write_logs(ledger)
+    log_ambiguous.close()
     conn_new_db.close()
     cursor_new.close()
     conn_old_db.close()
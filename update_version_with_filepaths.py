@@ -4,11 +4,22 @@ Created by Anna Movall and Jonas Lillqvist in February/March 2020.
 """
 
 import psycopg2
-import json
-from pathlib import Path
-import re
-from bs4 import BeautifulSoup
 from fuzzywuzzy import fuzz
+from lxml import etree
+
+from bulk_load import update_rows
+from catalogue import load_collection_catalogue
+from file_inventory import create_file_list
+from tei_cache import get_tei_metadata
+from tei_cache import commit_cache
+from fingerprint_index import create_fingerprint_index
+from filename_index import normalize_publication_name
+from canonical_xml import canonicalize_body
+from canonical_xml import get_body_digest
+from id_map import read_id_map
+from parallel import get_worker_count
+from parallel import map_collections
+from match_ledger import MatchLedger
 
 conn_new_db = psycopg2.connect(
     host="",
@@ -19,181 +30,175 @@ conn_new_db = psycopg2.connect(
 )
 cursor_new = conn_new_db.cursor()
 
-def read_dict_from_file(filename):
-    with open(filename, encoding="utf-8") as source_file:
-        json_content = json.load(source_file)
-        return json_content
-
-# get relevant info from table publication_version using select with collection id
-def get_version_info(new_collection_id):
-    fetch_query = """SELECT publication_version.id, publication.name, publication_version.legacy_id, publication_version.name FROM publication_version, publication WHERE publication_collection_id = %s AND publication.id = publication_id"""
-    cursor_new.execute(fetch_query, (new_collection_id,))
-    version_info = cursor_new.fetchall()
+# get relevant info about the versions in a collection from the catalogue
+def get_version_info(catalogue, new_collection_id):
+    version_info = [(version.id, publication.name, version.legacy_id, version.name) for publication, version in catalogue.get_versions(new_collection_id)]
     return version_info
 
-# create path object for folder from given filepath string, save all paths to files found in this folder or subfolders in a list
-def create_file_list(filepath):
-    path = Path(filepath)
-    filelist = []
-    iterate_through_folders(path, filelist)
-    return filelist
-
-# iterate through folders recursively and append filepaths to list
-def iterate_through_folders(path, filelist):
-    for content in path.iterdir():
-        if content.is_dir():
-            iterate_through_folders(content, filelist)
-        elif content.suffix == ".xml":
-            filelist.append(content)
-
 # opens an xml file from the web sever (the script uses a local copy of the files)
-# extracts its body element and removes added attributes to make it as similar as possible to the original xml file
-# returns the body for comparison
+# returns the canonical form of its body element, without the attributes added to the web files, for comparison
 def get_body_from_web_xml(filepath):
-    with open(filepath, encoding="utf-8") as source_file:
-        soup = BeautifulSoup(source_file, "xml")
-        body = soup.body
-        for tag in body.find_all("l"):
-            del tag["n"]
-        for tag in body.find_all("lg"):
-            del tag["xml:id"]
-        for tag in body.find_all("p"):
-            del tag["xml:id"]
-        return str(body)
+    return canonicalize_body(filepath)
 
-# opens an original xml file from SVN and extracts its body element
+# gets the canonical body element of an original xml file from SVN; the file is only parsed if it has changed since it was cached
 # returns the body for comparison
 def get_body_from_xml(filepath):
-    with filepath.open(encoding="utf-8", errors='ignore') as source_file:
-        soup = BeautifulSoup(source_file, "xml")
-        body = soup.body
-        return str(body)
+    return get_tei_metadata(filepath).body
 
-# opens an original xml file from SVN and extracts the text content of its title element
-def get_title_from_xml(filepath):
-    with filepath.open(encoding="utf-8", errors='ignore') as source_file:
-        soup = BeautifulSoup(source_file, "xml")
-        title = soup.title.get_text()
-        return title
+# gets the MinHash signature of the canonical body of an original xml file from SVN, for the fingerprint index; it is cached with the body
+def get_signature_from_xml(filepath):
+    return get_tei_metadata(filepath).signature
 
-# updates table publication_version with original_filename
-def update_publication_version(version_id, original_filename):
-    update_query = """UPDATE publication_version SET original_filename = %s WHERE id = %s"""
-    values_to_insert = (original_filename, version_id)
-    cursor_new.execute(update_query, values_to_insert)
+# updates table publication_version with original_filename for all matched versions at once
+# filename_updates is a list of (version_id, original_filename)
+def update_publication_version(filename_updates):
+    update_rows(cursor_new, "publication_version", "original_filename", filename_updates)
 
-# receives the publication name connected to the version and compares it to the folder names in the list of all file paths for this collection
-# matching paths are added to a list
+# group the file paths of a collection by the last directory in the path; this folder contains the versions of a specific publication
+# returns a dictionary with the directory name in lower case as key and the positions of its files in filepath_list as value
+def group_paths_by_directory(filepath_list):
+    directory_positions_dict = {}
+    for position, path in enumerate(filepath_list):
+        directory_positions_dict.setdefault(path.parts[-2].lower(), []).append(position)
+    return directory_positions_dict
+
+# receives the publication name connected to the version and compares it to the names of the directories containing the collection's files
+# the paths of the files in matching directories are returned in a list, in the same order as in filepath_list
 # we use partial match because folder names are sometimes shortened or altered versions of the publication name
-def compare_pub_name_with_directories(pub_name, filepath_list):
+# many versions belong to the same publication, so the result is saved in match_cache with the publication name as key
+def compare_pub_name_with_directories(pub_name, filepath_list, directory_positions_dict, match_cache):
+    if pub_name in match_cache:
+        return match_cache[pub_name]
     # remove special characters from publication names
-    search_str = re.sub(r",|\.|\?|!|–|’|»|:|(|)|\[|\]|&", "", pub_name).strip()
-    search_str = search_str.replace(" ", "_").lower()
-    search_str = search_str.replace("-", "_")
-    search_str = search_str.replace("ä", "a")
-    search_str = search_str.replace("å", "a")
-    search_str = search_str.replace("ö", "o")
-    search_str = search_str.replace("é", "e")
-    search_str = search_str.replace("ü", "u")
-    search_str = search_str.replace("æ", "ae")
-    i = 0
-    match_list = []
-    while i < len(filepath_list):
-        original_path = filepath_list[i]
-        dir_name = original_path.parts[-2].lower() # gets the last directory in the file path, this folder contains the versions of a specific publication
+    search_str = normalize_publication_name(pub_name)
+    positions = []
+    for dir_name, dir_positions in directory_positions_dict.items():
         match_ratio = fuzz.partial_ratio(search_str, dir_name) # compares publication name and folder name
         if match_ratio == 100:
-            match_list.append(original_path) # appends possible original paths for this version to a list
-        i += 1
+            positions.extend(dir_positions)
+    match_list = [filepath_list[position] for position in sorted(positions)] # possible original paths for this version
+    match_cache[pub_name] = match_list
     return match_list
 
-# check for duplicate file paths in log for matched versions; every file path should appear only once
-# duplicates are a sign of corrupt data that needs to be corrected manually
-def check_for_duplicate_file_paths():
-    log_duplicate_matched_versions = open("logs/duplicate_matched_versions.txt", "w", encoding="utf-8")
-    with open("logs/matched_versions.txt", "r", encoding="utf-8") as source_file:
-        all_text = source_file.read()
-        regex = re.compile(r"ORIGINAL PATH: .*?\.xml")
-        list_of_original_paths = re.findall(regex, all_text)
-        while len(list_of_original_paths) > 0:
-            last_item = list_of_original_paths.pop()
-            if last_item in list_of_original_paths:
-                log_duplicate_matched_versions.write("Duplicate: " + last_item + "\n")
-    log_duplicate_matched_versions.close()
-       
+# find the original file path for one version
+# a file with the same canonical body is a match at once; otherwise the fingerprint index gives the few files in the collection whose content is most similar to the web xml file
+# the exact similarity is only computed for them, and the most similar file is chosen if it is similar enough
+# returns the possible file paths (files in folders matching the publication name, used for the logs), the matching file path (or None if no match was found),
+# the similarity score, the method used for finding the match and a dictionary of details for the log:
+# the error if the web xml file couldn't be read, or the candidates if several original files have the same body
+def match_version(pub_name, web_xml_filepath, filepath_list, directory_positions_dict, match_cache, digest_path_dict, fingerprint_index):
+    original_path_list = compare_pub_name_with_directories(pub_name, filepath_list, directory_positions_dict, match_cache)
+    details = {}
+    try:
+        web_xml_body = get_body_from_web_xml(web_xml_filepath)
+    except (OSError, etree.XMLSyntaxError) as error:
+        # a missing or unreadable web xml file is logged, and there is no content to match
+        web_xml_body = ""
+        details["error"] = str(error)
+    # most web xml files have exactly the same content as their original file, and then the digests are equal
+    body_digest = get_body_digest(web_xml_body)
+    if web_xml_body != "" and body_digest in digest_path_dict:
+        digest_paths = digest_path_dict[body_digest]
+        # if several original files have the same body, a file in a folder matching the publication name is chosen if there is exactly one
+        if len(digest_paths) > 1:
+            digest_paths = [path for path in digest_paths if path in original_path_list] or digest_paths
+        if len(digest_paths) == 1:
+            return original_path_list, digest_paths[0], 100, "digest", details
+        # the files are identical, so the fuzzy comparison can't choose between them either; they are checked manually
+        details["candidates"] = [path.as_posix() for path in digest_paths]
+        return original_path_list, None, 100, "digest", details
+    original_filepath = None
+    best_score = 0
+    for path in fingerprint_index.get_nearest(web_xml_body):
+        content = get_body_from_xml(path)
+        score = fuzz.ratio(web_xml_body, content)
+        if score > best_score:
+            best_score = score
+            if score >= 90:
+                original_filepath = path
+    return original_path_list, original_filepath, best_score, "fingerprint", details
+
+# match all versions in one collection with the collection's files
+# task is a tuple of collection path and version info from get_version_info
+# returns the result of match_version for each version
+def match_collection(task):
+    collection_path, version_info = task
+    filepath_list = create_file_list(collection_path, ".xml") # create list of all version file paths in this collection
+    # group the files by directory and index the content of all version files in the collection once
+    directory_positions_dict = group_paths_by_directory(filepath_list)
+    # publication name as key, list of file paths in matching directories as value
+    match_cache = {}
+    # body digest as key, list of file paths with this digest as value
+    digest_path_dict = {}
+    for path in filepath_list:
+        digest_path_dict.setdefault(get_tei_metadata(path).body_digest, []).append(path)
+    fingerprint_index = create_fingerprint_index(filepath_list, get_signature_from_xml)
+    match_results = []
+    for tuple in version_info:
+        pub_name = tuple[1]
+        web_xml_filepath = "var/" + tuple[2]
+        match_results.append(match_version(pub_name, web_xml_filepath, filepath_list, directory_positions_dict, match_cache, digest_path_dict, fingerprint_index))
+    # save the metadata of new and changed files in the cache
+    commit_cache()
+    return match_results
+
+# write the text logs from the ledger
+# every file path should appear only once among the matched versions; duplicates are a sign of corrupt data that needs to be corrected manually
+def write_logs(ledger):
+    ledger.write_text_log("logs/version_directory_not_found_lfb.txt", lambda entry: "PUBLICATION NAME: " + entry["publication_name"] + " VERSION ID: " + str(entry["version_id"]) + "\n", "directory", "not_found")
+    ledger.write_text_log("logs/version_directory_found_lfb.txt", lambda entry: "PUBLICATION NAME: " + entry["publication_name"] + " VERSION ID: " + str(entry["version_id"]) + "\nPATH LIST: " + "\n" + "".join(path + "\n" for path in entry["paths"]), "directory", "found")
+    ledger.write_text_log("logs/matched_versions_lfb.txt", lambda entry: "\nPUBLICATION NAME: " + entry["publication_name"] + " WEB XML PATH: " + entry["web_xml_path"] + "\nORIGINAL PATH: " + entry["path"], "version", "matched", footer="\n" + ledger.get_match_summary("version", "Versions"))
+    ledger.write_text_log("logs/unmatched_versions_lfb.txt", lambda entry: "\nPUBLICATION NAME: " + entry["publication_name"] + " WEB XML PATH: " + entry["web_xml_path"], "version", "unmatched")
+    ledger.write_text_log("logs/ambiguous_versions_lfb.txt", lambda entry: "\nPUBLICATION NAME: " + entry["publication_name"] + " WEB XML PATH: " + entry["web_xml_path"] + "\nSAME CONTENT: " + ", ".join(entry["candidates"]), "version", "ambiguous")
+    ledger.write_text_log("logs/web_xml_errors_lfb.txt", lambda entry: "\nVERSION ID: " + str(entry["version_id"]) + " WEB XML PATH: " + entry["web_xml_path"] + "\nERROR: " + entry["error"], "web_xml", "error")
+    with open("logs/duplicate_matched_versions.txt", "w", encoding="utf-8") as log_duplicate_matched_versions:
+        for path, entries in ledger.get_duplicates():
+            log_duplicate_matched_versions.write("Duplicate: ORIGINAL PATH: " + path + " VERSION IDS: " + ", ".join(str(entry["version_id"]) for entry in entries) + "\n")
+
 def main():
-    collection_id_dict = read_dict_from_file("id_dictionaries/collection_ids.json")
+    workers = get_worker_count(__doc__)
+    collection_id_map = read_id_map("id_dictionaries/collection_ids.idmap")
     # list of collections with collection id and path to folder containing version files
     old_collections = [(32, "../../Topelius SVN/documents/Varianter/Lasning_for_barn_varianter")]
-    # initialize counters for match log statistics
-    version_count = 0
-    match_count = 0
-    log_directory_not_found = open("logs/version_directory_not_found_lfb.txt", "w", encoding="utf-8")
-    log_directory_found = open("logs/version_directory_found_lfb.txt", "w", encoding="utf-8")
-    log_matched_versions = open("logs/matched_versions_lfb.txt", "w", encoding="utf-8")
-    log_unmatched_versions = open("logs/unmatched_versions_lfb.txt", "w", encoding="utf-8")
+    # load the versions of all collections with one query per table
+    catalogue = load_collection_catalogue(cursor_new, [collection_id_map[collection[0]] for collection in old_collections], tables=("versions",))
+    ledger = MatchLedger("logs/versions_lfb.jsonl")
+    # version id and original_filename for each match; the table is updated with all of them at once
+    filename_updates = []
+    # select versions in all collections first, so that the matching of the collections can be done in parallel
+    collection_info = []
     for collection in old_collections:
         old_id = collection[0]
         collection_path = collection[1]
-        new_collection_id = collection_id_dict[str(old_id)] # get new collection id using dictionary
-        version_info = get_version_info(new_collection_id)
-        filepath_list = create_file_list(collection_path) # create list of all version file paths in this collection
-        for tuple in version_info:
-            version_count += 1
+        new_collection_id = collection_id_map[old_id] # get new collection id using id map
+        version_info = get_version_info(catalogue, new_collection_id)
+        collection_info.append((collection_path, version_info))
+    # the match results come in the same order as the collections
+    for (collection_path, version_info), match_results in zip(collection_info, map_collections(match_collection, collection_info, workers)):
+        for tuple, (original_path_list, original_filepath, score, method, details) in zip(version_info, match_results):
             version_id = tuple[0]
             pub_name = tuple[1]
             web_xml_filepath = "var/" + tuple[2]
-            version_name = tuple[3].strip()
-            original_path_list = compare_pub_name_with_directories(pub_name, filepath_list)
             # if no directory and thus no possible file paths were found for this version:
             if len(original_path_list) == 0:
-                log_directory_not_found.write("PUBLICATION NAME: " + pub_name + " VERSION ID: " + str(version_id) + "\n")
+                ledger.record("directory", "not_found", version_id=version_id, publication_name=pub_name)
+            else:
+                ledger.record("directory", "found", version_id=version_id, publication_name=pub_name, paths=[path.as_posix() for path in original_path_list])
+            if "error" in details:
+                ledger.record("web_xml", "error", version_id=version_id, web_xml_path=web_xml_filepath, error=details["error"])
+            # if we have found a file path for the version, update table publication_version with original_filename
+            if original_filepath is not None:
+                original_filename = original_filepath.as_posix().replace("../../Topelius SVN/", "") # shorten file path string
+                filename_updates.append((version_id, original_filename))
+                ledger.record("version", "matched", version_id=version_id, publication_name=pub_name, web_xml_path=web_xml_filepath, path=original_filename, score=score, method=method)
+            elif "candidates" in details:
+                ledger.record("version", "ambiguous", version_id=version_id, publication_name=pub_name, web_xml_path=web_xml_filepath, candidates=details["candidates"], score=score, method=method)
             else:
-                log_directory_found.write("PUBLICATION NAME: " + pub_name + " VERSION ID: " + str(version_id) + "\nPATH LIST: " + "\n")
-                for path in original_path_list:
-                    log_directory_found.write(path.as_posix() + "\n")
-                # for each file path with a folder name matching the publication name, get the content of the title element of the file and compare it with the version name
-                filepath_match_list = []
-                for path in original_path_list:
-                    title = get_title_from_xml(path).strip()
-                    # use for most collections:
-                    #if title == version_name:
-                    #use for lasning for barn:
-                    version_name = version_name.replace(",", "")
-                    title = title.replace("(", "")
-                    title = title.replace(")", "")
-                    title = title.replace(",", "")
-                    if version_name in title:
-                        filepath_match_list.append(path)
-                found = False
-                # if title matched version_name just once, we have found the file path
-                if len(filepath_match_list) == 1:
-                    original_filepath = filepath_match_list[0]
-                    found = True
-                # if title matched version_name more than once, we need to compare the content of the web xml file and the original (SVN) files in order to find the correct file path
-                elif len(filepath_match_list) > 1:
-                    web_xml_body = get_body_from_web_xml(web_xml_filepath)
-                    for path in filepath_match_list:
-                        content = get_body_from_xml(path)
-                        score = fuzz.ratio(web_xml_body, content)
-                        if score >= 90:
-                            original_filepath = path
-                            found = True
-                # if we have found a file path for the version, update table publication_version with original_filename
-                if found:
-                    match_count += 1
-                    original_filename = original_filepath.as_posix().replace("../../Topelius SVN/", "") # shorten file path string
-                    update_publication_version(version_id, original_filename)
-                    log_matched_versions.write("\nPUBLICATION NAME: " + pub_name + " WEB XML PATH: " + web_xml_filepath + "\nORIGINAL PATH: " + original_filename)
-                else:
-                    log_unmatched_versions.write("\nPUBLICATION NAME: " + pub_name + " WEB XML PATH: " + web_xml_filepath)
+                ledger.record("version", "unmatched", version_id=version_id, publication_name=pub_name, web_xml_path=web_xml_filepath, score=score, method=method)
+    update_publication_version(filename_updates)
     conn_new_db.commit()
-    log_matched_versions.write("\nVersions matched: " + str(match_count) + "/" + str(version_count) + ". Percentage matched: " + str(match_count/version_count*100))
-    log_directory_found.close()
-    log_directory_not_found.close()
-    log_matched_versions.close()
-    log_unmatched_versions.close()
-    check_for_duplicate_file_paths()
+    ledger.close()
+    write_logs(ledger)
     conn_new_db.close()
     cursor_new.close()
 